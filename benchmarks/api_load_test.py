@@ -0,0 +1,54 @@
+"""
+Concurrent load test for a running ontology_api instance. Sends POST /chunks
+requests at increasing concurrency and reports requests/sec per level, which
+should keep scaling while database calls no longer block the event loop.
+
+Requires httpx (pip install httpx).
+
+Usage:
+    python benchmarks/api_load_test.py [BASE_URL] [REQUESTS_PER_LEVEL] [CHUNK_ID ...]
+"""
+import asyncio
+import sys
+import time
+import uuid
+
+import httpx
+
+
+CONCURRENCY_LEVELS = [1, 4, 16, 64]
+
+
+async def run_level(client, concurrency, total_requests, chunk_ids):
+    queue = asyncio.Queue()
+    for _ in range(total_requests):
+        queue.put_nowait(None)
+    latencies = []
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.post("/chunks", json={"chunk_ids": chunk_ids})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    return total_requests / seconds, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1]
+
+
+async def main(base_url, total_requests, chunk_ids):
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        for concurrency in CONCURRENCY_LEVELS:
+            throughput, p50, p99 = await run_level(client, concurrency, total_requests, chunk_ids)
+            print(f"concurrency {concurrency:>3}: {throughput:8.1f} req/s  p50 {p50 * 1000:7.1f} ms  p99 {p99 * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://127.0.0.1:8000"
+    total_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    chunk_ids = sys.argv[3:] or [str(uuid.uuid4()) for _ in range(50)]
+    asyncio.run(main(base_url, total_requests, chunk_ids))
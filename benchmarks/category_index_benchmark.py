@@ -0,0 +1,55 @@
+"""
+Compare per-chunk `similarity_search` classification with the resident
+CategoryIndex on a real PDF and an existing parent category.
+
+Usage:
+    python benchmarks/category_index_benchmark.py path/to/book.pdf PARENT_CATEGORY_ID
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ontology_builder  # noqa: E402
+from ontology_builder import category_hierarchy, classify_splits  # noqa: E402
+from pdf_processing import process_pdf_file  # noqa: E402
+
+
+def per_chunk(all_splits, category_ids):
+    best_category_ids = []
+    for split in all_splits:
+        docs = ontology_builder.vector_store.similarity_search(split.page_content, k=1, filter={"id": {"$in": category_ids}})
+        best_category_ids.append(docs[0].metadata["id"] if docs else None)
+    return best_category_ids
+
+
+def main(file_path, category_id):
+    ontology_builder.init_builder()
+    all_splits = process_pdf_file(file_path)
+    session = ontology_builder.Session()
+    try:
+        category_ids = category_hierarchy.descendants(session, category_id) + [category_id]
+    finally:
+        session.close()
+    print(f"{len(all_splits)} chunks, {len(category_ids)} candidate categories")
+
+    start = time.perf_counter()
+    baseline = per_chunk(all_splits, category_ids)
+    per_chunk_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = classify_splits(all_splits, category_ids)
+    index_seconds = time.perf_counter() - start
+
+    agreement = sum(a == b for a, b in zip(baseline, indexed)) / max(len(all_splits), 1)
+    print(f"per-chunk similarity_search: {per_chunk_seconds:.2f}s ({len(all_splits) / per_chunk_seconds:.1f} chunks/s)")
+    print(f"category index:              {index_seconds:.2f}s ({len(all_splits) / index_seconds:.1f} chunks/s)")
+    print(f"speedup: {per_chunk_seconds / index_seconds:.1f}x, agreement: {agreement:.1%}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    main(sys.argv[1], sys.argv[2])
@@ -0,0 +1,74 @@
+"""
+Generates a synthetic PDF corpus without any PDF library: every topic has its
+own vocabulary so chunks can be classified into matching categories.
+"""
+import os
+import random
+
+
+TOPICS = {
+    "algebra": "equation variable polynomial matrix linear quadratic factor coefficient solve root",
+    "biology": "cell protein organism enzyme membrane genetic species evolution tissue nucleus",
+    "chemistry": "molecule reaction acid bond electron compound catalyst solution element oxidation",
+    "history": "empire treaty revolution dynasty colony war parliament trade century monarch",
+    "physics": "force energy momentum velocity particle wave field quantum gravity mass",
+}
+
+FILLER = "the of and a to in is that for with as by this on are from which"
+
+
+def _escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages):
+    """Write a minimal PDF where `pages` is a list of pages, each a list of text lines."""
+    page_ids = [4 + 2 * i for i in range(len(pages))]
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: f"<< /Type /Pages /Kids [{' '.join(f'{page_id} 0 R' for page_id in page_ids)}] /Count {len(pages)} >>".encode(),
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    for page_id, lines in zip(page_ids, pages):
+        stream = ("BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"({_escape(line)}) Tj T*" for line in lines) + " ET").encode("latin-1")
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>"
+        ).encode()
+        objects[page_id + 1] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(out)
+        out += b"%d 0 obj\n" % object_id + objects[object_id] + b"\nendobj\n"
+    xref = len(out)
+    size = max(objects) + 1
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % size
+    for object_id in range(1, size):
+        out += b"%010d 00000 n \n" % offsets[object_id]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def generate_corpus(directory, files, pages_per_file, seed=0):
+    """Write `files` PDFs into `directory` and return their file names."""
+    rng = random.Random(seed)
+    topics = list(TOPICS)
+    filler = FILLER.split()
+    file_names = []
+    os.makedirs(directory, exist_ok=True)
+    for file_index in range(files):
+        pages = []
+        for _ in range(pages_per_file):
+            vocabulary = TOPICS[rng.choice(topics)].split()
+            lines = []
+            for _ in range(60):
+                words = [rng.choice(vocabulary) if rng.random() < 0.4 else rng.choice(filler) for _ in range(13)]
+                lines.append(" ".join(words) + ".")
+            pages.append(lines)
+        file_name = f"benchmark_{seed}_{file_index}.pdf"
+        write_pdf(os.path.join(directory, file_name), pages)
+        file_names.append(file_name)
+    return file_names
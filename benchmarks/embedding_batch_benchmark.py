@@ -0,0 +1,46 @@
+"""
+Embeddings/sec and per-call latency of concurrent single-text embedding calls
+against the local Ollama model, sent directly and through BatchingEmbeddings.
+
+Usage:
+    python benchmarks/embedding_batch_benchmark.py [THREADS] [CALLS_PER_THREAD]
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_ollama import OllamaEmbeddings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_batcher import BatchingEmbeddings  # noqa: E402
+
+
+def run(embeddings, threads, calls):
+    def worker(thread_index):
+        latencies = []
+        for call in range(calls):
+            start = time.perf_counter()
+            embeddings.embed_documents([f"benchmark text {thread_index} {call} about photosynthesis and cells"])
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        latencies = [latency for result in executor.map(worker, range(threads)) for latency in result]
+    elapsed = time.perf_counter() - start
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return threads * calls / elapsed, p50, p99
+
+
+def main(threads, calls):
+    model = OllamaEmbeddings(model="bge-m3:latest")
+    for name, embeddings in (("direct", model), ("batched", BatchingEmbeddings(model))):
+        rate, p50, p99 = run(embeddings, threads, calls)
+        print(f"{name:>8}: {rate:8.1f} texts/s  p50 {p50:7.1f} ms  p99 {p99:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 16, int(sys.argv[2]) if len(sys.argv) > 2 else 50)
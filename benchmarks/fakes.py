@@ -0,0 +1,123 @@
+"""
+Deterministic local stand-ins for the external services used by the builder:
+the Ollama embedding model and the Kafka consumer/producer.
+"""
+import json
+import re
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Hashed bag-of-words embeddings: texts sharing vocabulary get similar
+    vectors, so classification behaves sensibly, and the output is identical
+    across runs and processes.
+    """
+
+    def __init__(self, dim):
+        self.dim = dim
+        self.calls = 0
+        self.texts = 0
+
+    def _embed(self, text_value):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"\w+", text_value.lower()):
+            bucket = zlib.crc32(word.encode("utf-8"))
+            vector[bucket % self.dim] += 1.0 if bucket & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.texts += len(texts)
+        return [self._embed(text_value) for text_value in texts]
+
+    def embed_query(self, text_value):
+        return self.embed_documents([text_value])[0]
+
+
+class FakeMessage:
+    def __init__(self, topic, partition, offset, value, key=None):
+        self._topic = topic
+        self._partition = partition
+        self._offset = offset
+        self._value = value
+        self._key = key
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def value(self):
+        return self._value
+
+    def key(self):
+        return self._key
+
+    def error(self):
+        return None
+
+
+class FakeConsumer:
+    """
+    In-process replacement for confluent_kafka.Consumer that replays a fixed
+    list of request dicts and then raises KeyboardInterrupt, which makes the
+    builder's main() shut down cleanly.
+    """
+
+    def __init__(self, topic, requests):
+        self.messages = [
+            FakeMessage(topic, 0, offset, json.dumps(request).encode("utf-8"))
+            for offset, request in enumerate(requests)
+        ]
+        self.committed = {}
+
+    def subscribe(self, topics, **kwargs):
+        pass
+
+    def poll(self, timeout=None):
+        if not self.messages:
+            raise KeyboardInterrupt
+        return self.messages.pop(0)
+
+    def commit(self, offsets=None, asynchronous=True, **kwargs):
+        for offset in offsets or []:
+            self.committed[(offset.topic, offset.partition)] = offset.offset
+
+    def pause(self, partitions):
+        pass
+
+    def resume(self, partitions):
+        pass
+
+    def assignment(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class FakeProducer:
+    """In-process replacement for ResponseProducer that keeps every message."""
+
+    def __init__(self):
+        self.messages = []
+
+    def produce(self, topic, value, key=None):
+        self.messages.append((topic, key, value))
+
+    @contextmanager
+    def collect(self):
+        yield
+
+    def flush(self, timeout=30.0):
+        pass
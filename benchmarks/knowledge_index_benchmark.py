@@ -0,0 +1,81 @@
+"""
+Time the builder/API lookups on a 1M-row copy of the knowledge table before
+and after creating the indexes of migration 1. Works on a scratch table
+(knowledge_index_benchmark) that is dropped afterwards.
+
+Usage:
+    python benchmarks/knowledge_index_benchmark.py [ROWS]
+"""
+import os
+import sys
+import time
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from env import DATABASE_URL  # noqa: E402
+
+
+TABLE = "knowledge_index_benchmark"
+REPEAT = 50
+
+INDEXES = [
+    f"CREATE INDEX ON {TABLE} (chunk_id)",
+    f"CREATE INDEX ON {TABLE} (file_id, id)",
+    f"CREATE INDEX ON {TABLE} (category_id, id)",
+]
+
+
+def lookups(chunk_id):
+    return {
+        "chunk_id =": (text(f"SELECT * FROM {TABLE} WHERE chunk_id = :value"), {"value": chunk_id}),
+        "file_id page": (text(f"SELECT * FROM {TABLE} WHERE file_id = :value ORDER BY id LIMIT 100"), {"value": "file-42"}),
+        "category_id page": (text(f"SELECT * FROM {TABLE} WHERE category_id = :value ORDER BY id LIMIT 100"), {"value": "category-7"}),
+    }
+
+
+def time_lookups(connection, chunk_id):
+    results = {}
+    for name, (statement, params) in lookups(chunk_id).items():
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            connection.execute(statement, params).all()
+        results[name] = (time.perf_counter() - start) / REPEAT * 1000
+    return results
+
+
+def main(rows):
+    engine = create_engine(DATABASE_URL)
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        connection.execute(text(f"CREATE TABLE {TABLE} (LIKE knowledge INCLUDING DEFAULTS)"))
+        start = time.perf_counter()
+        connection.execute(text(f"""
+            INSERT INTO {TABLE} (id, category_id, text, chunk_id, file_id)
+            SELECT n, 'category-' || (n % 5000), repeat('x', 200), gen_random_uuid(), 'file-' || (n / 600)
+            FROM generate_series(1, :rows) AS n
+        """), {"rows": rows})
+        connection.execute(text(f"ANALYZE {TABLE}"))
+        print(f"loaded {rows:,} rows in {time.perf_counter() - start:.1f}s")
+        chunk_id = connection.execute(text(f"SELECT chunk_id FROM {TABLE} WHERE id = :id"), {"id": rows // 2}).scalar()
+    try:
+        with engine.connect() as connection:
+            before = time_lookups(connection, chunk_id)
+        with engine.begin() as connection:
+            start = time.perf_counter()
+            for statement in INDEXES:
+                connection.execute(text(statement))
+            connection.execute(text(f"ANALYZE {TABLE}"))
+            print(f"built indexes in {time.perf_counter() - start:.1f}s")
+        with engine.connect() as connection:
+            after = time_lookups(connection, chunk_id)
+        for name in before:
+            print(f"{name:>18}: {before[name]:9.2f} ms -> {after[name]:7.2f} ms ({before[name] / after[name]:.0f}x)")
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
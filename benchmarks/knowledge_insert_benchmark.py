@@ -0,0 +1,62 @@
+"""
+Measure knowledge rows/sec for per-row ORM inserts versus the batched
+store_chunks() path on a synthetic file.
+
+Usage:
+    python benchmarks/knowledge_insert_benchmark.py [CHUNKS]
+"""
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+
+import ontology_builder  # noqa: E402
+from ontology_builder import Knowledge, store_chunks  # noqa: E402
+
+
+def synthetic_rows(file_id, chunks):
+    text = "lorem ipsum dolor sit amet " * 70  # roughly one 2000 character split
+    return [
+        {'category_id': 'benchmark', 'text': text, 'chunk_id': uuid.uuid4(), 'file_id': file_id}
+        for _ in range(chunks)
+    ]
+
+
+def orm_insert(session, file_id, rows):
+    for row in rows:
+        session.add(Knowledge(**row))
+    session.commit()
+
+
+def batched_insert(session, file_id, rows):
+    store_chunks(session, rows)
+
+
+def cleanup(session, file_id):
+    session.query(Knowledge).filter(Knowledge.file_id == file_id).delete()
+    session.execute(text("DELETE FROM ingest_progress WHERE file_id = :file_id"), {'file_id': file_id})
+    session.commit()
+
+
+def main(chunks):
+    ontology_builder.init_builder()
+    session = ontology_builder.Session()
+    try:
+        for name, insert_rows in (("orm session.add", orm_insert), ("store_chunks", batched_insert)):
+            file_id = f"benchmark-{uuid.uuid4()}"
+            rows = synthetic_rows(file_id, chunks)
+            start = time.perf_counter()
+            insert_rows(session, file_id, rows)
+            seconds = time.perf_counter() - start
+            cleanup(session, file_id)
+            print(f"{name:>16}: {chunks} rows in {seconds:.2f}s ({chunks / seconds:,.0f} rows/s)")
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,240 @@
+"""
+Reproducible offline benchmark for the ingestion and API paths.
+
+Only a local Postgres with pgvector (configured in env.py) is needed: Ollama is
+replaced by a deterministic fake embedding model and Kafka by an in-process
+consumer/producer. The run generates a PDF corpus, drives
+ontology_builder.main() end to end, then loads the ontology_api endpoints
+in-process, and removes everything it created afterwards.
+
+Reports chunks/sec, p50/p99 per-message latency, peak RSS and API
+requests/sec, and writes them as JSON so runs can be compared.
+
+Requires httpx (pip install httpx).
+
+Usage:
+    python benchmarks/run_benchmarks.py [--files 5] [--pages 40] [--workers 0]
+        [--api-requests 500] [--concurrency 16] [--output results.json] [--compare previous.json]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import TOPICS, generate_corpus  # noqa: E402
+from fakes import FakeConsumer, FakeEmbeddings, FakeProducer  # noqa: E402
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def build_requests(run_id, file_ids):
+    root_id = f"{run_id}-root"
+    requests = [{
+        "category_id": root_id,
+        "category_name": "Benchmark root",
+        "learning_obj": "general knowledge",
+        "tenant": run_id,
+    }]
+    for topic, vocabulary in TOPICS.items():
+        requests.append({
+            "category_id": f"{run_id}-{topic}",
+            "category_name": topic,
+            "learning_obj": vocabulary,
+            "parent_id": root_id,
+            "tenant": run_id,
+        })
+    for file_id in file_ids:
+        requests.append({"file_id": file_id, "category_id": root_id, "tenant": run_id})
+    return requests
+
+
+def run_builder(builder, run_id, corpus_directory, file_names):
+    from sqlalchemy import text
+
+    from split_cache import SplitCache
+
+    file_ids = [f"{run_id}-file-{index}" for index in range(len(file_names))]
+    session = builder.Session()
+    for file_id, file_name in zip(file_ids, file_names):
+        with open(os.path.join(corpus_directory, file_name), "rb") as f:
+            hash_value = hashlib.sha256(f.read() + run_id.encode()).hexdigest()
+        session.add(builder.Files(file_name=file_name, file_id=file_id, hash_value=hash_value, status="0"))
+    session.commit()
+
+    fake_embeddings = FakeEmbeddings(builder.EMBEDDING_DIM)
+    # Replaces the model behind the batcher, so batching is part of the measurement
+    builder.local_embeddings.embeddings.embeddings = fake_embeddings
+    builder.local_embeddings.model_name = f"benchmark-fake-{run_id}"
+    builder.split_cache = SplitCache(os.path.join(corpus_directory, "split_cache"), 1024 ** 3, builder.SPLITTER_PARAMS)
+    builder.LOCAL_DIRECTORY = corpus_directory
+    builder.producer = FakeProducer()
+    builder.consumer = FakeConsumer("panini-ontology-request", build_requests(run_id, file_ids))
+
+    latencies = []
+    handle_message = builder.handle_message
+
+    def timed_handle_message(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return handle_message(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    builder.handle_message = timed_handle_message
+    start = time.perf_counter()
+    builder.main()
+    seconds = time.perf_counter() - start
+    builder.handle_message = handle_message
+
+    chunks = session.execute(
+        text("SELECT count(*) FROM knowledge WHERE file_id = ANY(:file_ids)"), {"file_ids": file_ids}
+    ).scalar()
+    session.close()
+    return file_ids, {
+        "messages": len(latencies),
+        "chunks": chunks,
+        "seconds": seconds,
+        "chunks_per_sec": chunks / seconds,
+        "message_latency_p50_ms": percentile(latencies, 0.5) * 1000,
+        "message_latency_p99_ms": percentile(latencies, 0.99) * 1000,
+        "embedding_calls": fake_embeddings.calls,
+        "responses": len(builder.producer.messages),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def run_api(file_ids, chunk_ids, total_requests, concurrency):
+    import httpx
+
+    import ontology_api
+
+    await ontology_api.warm_up()
+    rng = random.Random(0)
+    requests = []
+    for index in range(total_requests):
+        kind = index % 3
+        if kind == 0:
+            requests.append(("POST", "/chunks", {"json": {"chunk_ids": rng.sample(chunk_ids, min(50, len(chunk_ids)))}}))
+        elif kind == 1:
+            requests.append(("GET", "/chunks", {"params": {"file_id": rng.choice(file_ids), "limit": 100}}))
+        else:
+            requests.append(("POST", "/chunks/stream", {"json": {"chunk_ids": rng.sample(chunk_ids, min(500, len(chunk_ids)))}}))
+
+    latencies = []
+    transport = httpx.ASGITransport(app=ontology_api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        async def worker():
+            while requests:
+                method, url, kwargs = requests.pop()
+                start = time.perf_counter()
+                response = await client.request(method, url, **kwargs)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        seconds = time.perf_counter() - start
+    await ontology_api.shutdown()
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "requests_per_sec": len(latencies) / seconds,
+        "latency_p50_ms": percentile(latencies, 0.5) * 1000,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def cleanup(builder, run_id, file_ids):
+    from sqlalchemy import text
+
+    category_ids = [f"{run_id}-root"] + [f"{run_id}-{topic}" for topic in TOPICS]
+    with builder.engine.begin() as connection:
+        connection.execute(text("DELETE FROM knowledge WHERE file_id = ANY(:ids)"), {"ids": file_ids})
+        connection.execute(text("DELETE FROM knowledge_file_info WHERE file_id = ANY(:ids)"), {"ids": file_ids})
+        connection.execute(text("DELETE FROM ingest_progress WHERE file_id = ANY(:ids)"), {"ids": file_ids})
+        connection.execute(text("DELETE FROM category WHERE category_id = ANY(:ids)"), {"ids": category_ids})
+        connection.execute(text("DELETE FROM langchain_pg_embedding WHERE id = ANY(:ids)"), {"ids": category_ids})
+        connection.execute(text("DELETE FROM embedding_cache WHERE model LIKE :model"), {"model": f"benchmark-fake-{run_id}%"})
+
+
+def compare(results, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\nCompared with {previous_path} ({previous.get('git_commit')}):")
+    for section in ("builder", "api"):
+        for key, value in results[section].items():
+            old = previous.get(section, {}).get(key)
+            if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+                print(f"  {section}.{key}: {old:.2f} -> {value:.2f} ({(value - old) / old:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=0, help="BUILDER_WORKERS for the run")
+    parser.add_argument("--api-requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare")
+    args = parser.parse_args()
+
+    # Read by ontology_builder at import time
+    os.environ["BUILDER_WORKERS"] = str(args.workers)
+    os.environ["BUILDER_METRICS_PORT"] = "0"
+    import ontology_builder
+    ontology_builder.init_builder()
+
+    run_id = f"bench{int(time.time())}"
+    corpus_directory = tempfile.mkdtemp(prefix="ontology-benchmark-")
+    file_names = generate_corpus(corpus_directory, args.files, args.pages)
+    file_ids = []
+    try:
+        file_ids, builder_results = run_builder(ontology_builder, run_id, corpus_directory, file_names)
+        with ontology_builder.engine.connect() as connection:
+            from sqlalchemy import text
+            chunk_ids = [str(chunk_id) for chunk_id in connection.execute(
+                text("SELECT chunk_id FROM knowledge WHERE file_id = ANY(:ids)"), {"ids": file_ids}
+            ).scalars()]
+        api_results = asyncio.run(run_api(file_ids, chunk_ids, args.api_requests, args.concurrency))
+    finally:
+        cleanup(ontology_builder, run_id, file_ids)
+
+    git_commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    results = {
+        "git_commit": git_commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "parameters": vars(args),
+        "builder": builder_results,
+        "api": api_results,
+    }
+    print(json.dumps(results, indent=2))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Latency and recall of the /search query (ontology_api.build_search_query) on
+1M stored chunk embeddings. Works on scratch copies of the knowledge and
+category tables (dropped afterwards) filled with random vectors, with and
+without the tenant and subtree filters.
+
+Usage:
+    python benchmarks/search_benchmark.py [--rows 1000000] [--dim 1024] [--target-ms 50]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from env import DATABASE_URL  # noqa: E402
+from migrations import EMBEDDING_DIM  # noqa: E402
+from ontology_api import SEARCH_ITERATIVE_SCAN, build_search_query  # noqa: E402
+
+
+KNOWLEDGE_TABLE = "knowledge_search_benchmark"
+CATEGORY_TABLE = "category_search_benchmark"
+CATEGORIES = 5000
+TENANTS = 10
+QUERIES = 100
+LIMIT = 10
+
+
+def scratch_query(tenant, category_ids):
+    sql = str(build_search_query(tenant, category_ids))
+    sql = sql.replace("FROM knowledge k", f"FROM {KNOWLEDGE_TABLE} k").replace("FROM category ", f"FROM {CATEGORY_TABLE} ")
+    return text(sql)
+
+
+def load(engine, rows, dim):
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE IF EXISTS {KNOWLEDGE_TABLE}, {CATEGORY_TABLE}"))
+        connection.execute(text(f"CREATE TABLE {CATEGORY_TABLE} (category_id VARCHAR(255), tenant VARCHAR)"))
+        connection.execute(text(f"""
+            INSERT INTO {CATEGORY_TABLE}
+            SELECT 'category-' || n, 'tenant-' || (n % {TENANTS}) FROM generate_series(0, {CATEGORIES - 1}) AS n
+        """))
+        connection.execute(text(f"""
+            CREATE TABLE {KNOWLEDGE_TABLE} (
+                id INTEGER PRIMARY KEY, category_id VARCHAR(255), text VARCHAR,
+                chunk_id UUID, file_id VARCHAR(255), embedding vector({dim})
+            )
+        """))
+        start = time.perf_counter()
+        connection.execute(text(f"""
+            INSERT INTO {KNOWLEDGE_TABLE}
+            SELECT n, 'category-' || (n % {CATEGORIES}), repeat('x', 200), gen_random_uuid(), 'file-' || (n / 600),
+                   (SELECT array_agg(random() - 0.5)::vector FROM generate_series(1, {dim}) WHERE n > 0)
+            FROM generate_series(1, :rows) AS n
+        """), {"rows": rows})
+        print(f"loaded {rows:,} chunks in {time.perf_counter() - start:.1f}s")
+        start = time.perf_counter()
+        connection.execute(text(f"CREATE INDEX ON {KNOWLEDGE_TABLE} USING hnsw (embedding vector_cosine_ops)"))
+        connection.execute(text(f"CREATE INDEX ON {KNOWLEDGE_TABLE} (category_id, id)"))
+        connection.execute(text(f"ANALYZE {KNOWLEDGE_TABLE}"))
+        print(f"built indexes in {time.perf_counter() - start:.1f}s")
+
+
+def run(connection, statement, params, exact):
+    connection.execute(text(f"SET LOCAL hnsw.ef_search = {max(40, params['window'])}"))
+    if SEARCH_ITERATIVE_SCAN:
+        connection.execute(text(f"SET LOCAL hnsw.iterative_scan = {SEARCH_ITERATIVE_SCAN}"))
+    if exact:
+        connection.execute(text("SET LOCAL enable_indexscan = off"))
+    return [row.chunk_id for row in connection.execute(statement, params)]
+
+
+def measure(engine, name, tenant, category_ids, dim, target_ms):
+    statement = scratch_query(tenant, category_ids)
+    rng = np.random.default_rng(42)
+    latencies = []
+    recalls = []
+    for _ in range(QUERIES):
+        vector = rng.random(dim) - 0.5
+        params = {
+            "query": "[" + ",".join(str(value) for value in vector) + "]",
+            "tenant": tenant,
+            "category_ids": category_ids,
+            "window": LIMIT,
+            "offset": 0,
+            "limit": LIMIT,
+        }
+        with engine.begin() as connection:
+            start = time.perf_counter()
+            found = run(connection, statement, params, exact=False)
+            latencies.append((time.perf_counter() - start) * 1000)
+        with engine.begin() as connection:
+            expected = run(connection, statement, params, exact=True)
+        recalls.append(len(set(found) & set(expected)) / max(len(expected), 1))
+    p50, p99 = np.percentile(latencies, [50, 99])
+    verdict = "ok" if p99 <= target_ms else "over target"
+    print(f"{name:>16}: p50 {p50:7.2f} ms  p99 {p99:7.2f} ms  recall@{LIMIT} {np.mean(recalls):.3f}  ({verdict})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM)
+    parser.add_argument("--target-ms", type=float, default=50.0, help="p99 latency target per query")
+    args = parser.parse_args()
+    engine = create_engine(DATABASE_URL)
+    load(engine, args.rows, args.dim)
+    try:
+        subtree = [f"category-{n}" for n in range(0, CATEGORIES, CATEGORIES // 50)]
+        measure(engine, "unfiltered", None, None, args.dim, args.target_ms)
+        measure(engine, "tenant", "tenant-3", None, args.dim, args.target_ms)
+        measure(engine, "tenant + subtree", "tenant-0", subtree, args.dim, args.target_ms)
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE IF EXISTS {KNOWLEDGE_TABLE}, {CATEGORY_TABLE}"))
+
+
+if __name__ == "__main__":
+    main()
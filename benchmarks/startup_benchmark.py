@@ -0,0 +1,90 @@
+"""
+Cold start of the API and the builder: seconds to import each module, and
+seconds from process start until its readiness probe answers 200. Needs
+PostgreSQL and Ollama. The builder is pointed at an unreachable Kafka broker
+(--kafka) so it never consumes real requests; creating the Kafka clients does
+not wait for the broker.
+
+Commits before the lazy startup have no /readyz. To measure them, pass
+`--api-ready-path /openapi.json` (uvicorn only serves once startup is done)
+and `--builder-ready-path /metrics` (served once the import has finished).
+Those commits also ignore KAFKA_BOOTSTRAP_SERVERS and join the `my-group`
+consumer group on localhost:9092, so only measure them against a development
+broker.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--repeat 3] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_seconds(module):
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def ready_seconds(command, url, env, timeout):
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"{' '.join(command)} exited with {process.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.05)
+        raise TimeoutError(f"{url} not ready after {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--api-port", type=int, default=8765)
+    parser.add_argument("--builder-port", type=int, default=9765)
+    parser.add_argument("--api-ready-path", default="/readyz")
+    parser.add_argument("--builder-ready-path", default="/readyz")
+    parser.add_argument("--kafka", default="127.0.0.1:1", help="KAFKA_BOOTSTRAP_SERVERS of the builder")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    api = (
+        [sys.executable, "-m", "uvicorn", "ontology_api:app", "--port", str(args.api_port)],
+        f"http://127.0.0.1:{args.api_port}{args.api_ready_path}",
+        {},
+    )
+    builder = (
+        [sys.executable, "ontology_builder.py"],
+        f"http://127.0.0.1:{args.builder_port}{args.builder_ready_path}",
+        {"BUILDER_METRICS_PORT": str(args.builder_port), "KAFKA_BOOTSTRAP_SERVERS": args.kafka},
+    )
+    results = {}
+    for name, module, (command, url, env) in (("api", "ontology_api", api), ("builder", "ontology_builder", builder)):
+        imports = [import_seconds(module) for _ in range(args.repeat)]
+        readies = [ready_seconds(command, url, env, args.timeout) for _ in range(args.repeat)]
+        results[name] = {"import_seconds": min(imports), "ready_seconds": min(readies)}
+        print(f"{name:>8}: import {min(imports):6.2f}s  ready {min(readies):6.2f}s (best of {args.repeat})")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
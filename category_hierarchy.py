@@ -0,0 +1,69 @@
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+
+# All descendants of a category in a single round trip. UNION (rather than
+# UNION ALL) keeps a malformed parent cycle from recursing forever.
+DESCENDANTS_QUERY = text("""
+    WITH RECURSIVE subtree(category_id) AS (
+        SELECT category_id FROM category WHERE parent_id = :category_id
+        UNION
+        SELECT c.category_id FROM category c JOIN subtree s ON c.parent_id = s.category_id
+    )
+    SELECT category_id FROM subtree
+""")
+
+# A category and all of its descendants, used for set-based subtree deletes
+SUBTREE_CTE = """
+    WITH RECURSIVE subtree(category_id) AS (
+        SELECT category_id FROM category WHERE category_id = :category_id
+        UNION
+        SELECT c.category_id FROM category c JOIN subtree s ON c.parent_id = s.category_id
+    )
+"""
+
+COUNT_SUBTREE_QUERY = text(SUBTREE_CTE + "SELECT count(*) FROM subtree")
+
+DELETE_SUBTREE_QUERY = text(SUBTREE_CTE + """,
+    deleted AS (
+        DELETE FROM category WHERE category_id IN (SELECT category_id FROM subtree)
+        RETURNING category_id
+    )
+    SELECT DISTINCT category_id FROM deleted
+""")
+
+CATEGORY_CACHE_TTL = float(os.environ.get("CATEGORY_CACHE_TTL", "30"))
+
+
+class CategoryHierarchy:
+    """
+    Descendant lookups backed by a recursive CTE and an in-process cache.
+
+    Local creates and deletes call `invalidate()`; the TTL bounds how long a
+    change made by another process (API vs builder) can go unnoticed.
+    """
+
+    def __init__(self, ttl=CATEGORY_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def descendants(self, session, category_id):
+        """Return the ids of every category below `category_id` (excluding itself)."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(category_id)
+        if cached is not None and now - cached[0] < self.ttl:
+            return list(cached[1])
+        category_ids = [row.category_id for row in session.execute(DESCENDANTS_QUERY, {"category_id": category_id})]
+        with self._lock:
+            self._cache[category_id] = (now, tuple(category_ids))
+        return category_ids
+
+    def invalidate(self):
+        # A create or delete changes the subtree of every ancestor, so drop everything
+        with self._lock:
+            self._cache.clear()
@@ -0,0 +1,124 @@
+import json
+import threading
+
+import numpy as np
+from sqlalchemy import bindparam, text
+
+
+# Category vectors stored by PGVector for the given collection with their
+# tenant, falling back to the category table for vectors stored without one.
+CATEGORY_VECTORS_QUERY = """
+    SELECT e.id AS category_id, e.embedding::text AS embedding, COALESCE(e.cmetadata->>'tenant', c.tenant) AS tenant
+    FROM langchain_pg_embedding e
+    JOIN langchain_pg_collection col ON col.uuid = e.collection_id
+    LEFT JOIN category c ON c.category_id = e.id
+    WHERE col.name = :collection_name
+"""
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class CategoryIndex:
+    """
+    Resident matrix of category embeddings used to classify chunks.
+
+    Rows are L2-normalised so a single matrix product gives the cosine
+    similarity PGVector uses by default. The matrix is over-allocated and
+    doubles when full, so inserts are amortised O(1). Categories missing from
+    the matrix (e.g. created by another builder instance) are fetched on demand,
+    categories deleted elsewhere are dropped with `remove()`.
+    """
+
+    def __init__(self, engine, collection_name):
+        self.engine = engine
+        self.collection_name = collection_name
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._ids = []
+        self._rows = {}
+        self._tenants = {}
+
+    def load(self, category_ids=None):
+        """Load category vectors from the collection, all of them when no ids are given."""
+        query = CATEGORY_VECTORS_QUERY
+        params = {"collection_name": self.collection_name}
+        if category_ids is not None:
+            query += " AND e.id IN :category_ids"
+            params["category_ids"] = list(category_ids)
+        statement = text(query)
+        if category_ids is not None:
+            statement = statement.bindparams(bindparam("category_ids", expanding=True))
+        with self.engine.connect() as connection:
+            rows = connection.execute(statement, params).all()
+        self.add_many((row.category_id, json.loads(row.embedding), row.tenant) for row in rows)
+        return len(rows)
+
+    def add(self, category_id, embedding, tenant=None):
+        """Insert or replace the vector of a single category."""
+        self.add_many([(category_id, embedding, tenant)])
+
+    def add_many(self, entries):
+        """Insert or replace the vectors of (category_id, embedding, tenant) entries."""
+        entries = list(entries)
+        if not entries:
+            return
+        vectors = _normalize(np.asarray([embedding for _, embedding, _ in entries], dtype=np.float32))
+        with self._lock:
+            self._reserve(len(self._ids) + len(entries), vectors.shape[1])
+            for (category_id, _, tenant), vector in zip(entries, vectors):
+                if category_id not in self._rows:
+                    self._rows[category_id] = len(self._ids)
+                    self._ids.append(category_id)
+                self._matrix[self._rows[category_id]] = vector
+                self._tenants.setdefault(tenant, set()).add(category_id)
+
+    def remove(self, category_ids):
+        """Drop the vectors of deleted categories; the last row fills each gap."""
+        with self._lock:
+            for category_id in category_ids:
+                row = self._rows.pop(category_id, None)
+                if row is None:
+                    continue
+                last_id = self._ids.pop()
+                if last_id != category_id:
+                    self._matrix[row] = self._matrix[len(self._ids)]
+                    self._ids[row] = last_id
+                    self._rows[last_id] = row
+                for members in self._tenants.values():
+                    members.discard(category_id)
+
+    def _reserve(self, rows, dim):
+        capacity = 0 if self._matrix is None else len(self._matrix)
+        if rows <= capacity:
+            return
+        matrix = np.empty((max(rows, capacity * 2, 64), dim), dtype=np.float32)
+        if self._matrix is not None:
+            matrix[:len(self._ids)] = self._matrix[:len(self._ids)]
+        self._matrix = matrix
+
+    def classify(self, vectors, category_ids, tenant=None):
+        """
+        Return the best matching category id for each vector, restricted to
+        `category_ids` (and to `tenant` when given). Entries are None when no
+        candidate category has a vector.
+        """
+        missing = [category_id for category_id in category_ids if category_id not in self._rows]
+        if missing:
+            self.load(missing)
+        with self._lock:
+            candidates = [category_id for category_id in dict.fromkeys(category_ids) if category_id in self._rows]
+            if tenant is not None:
+                candidates = [category_id for category_id in candidates if category_id in self._tenants.get(tenant, ())]
+            if not candidates or len(vectors) == 0:
+                return [None] * len(vectors)
+            matrix = self._matrix[[self._rows[category_id] for category_id in candidates]]
+        queries = _normalize(np.asarray(vectors, dtype=np.float32))
+        best = (queries @ matrix.T).argmax(axis=1)
+        return [candidates[i] for i in best]
+
+    def __len__(self):
+        return len(self._ids)
@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from langchain_core.embeddings import Embeddings
+from prometheus_client import Counter, Histogram
+
+
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "256"))
+EMBED_BATCH_WAIT_MS = float(os.environ.get("EMBED_BATCH_WAIT_MS", "10"))
+# Texts waiting for a batch before callers block (and eventually time out)
+EMBED_MAX_QUEUED = int(os.environ.get("EMBED_MAX_QUEUED", "4096"))
+EMBED_TIMEOUT = float(os.environ.get("EMBED_TIMEOUT", "120"))
+
+BATCH_FILL = Histogram(
+    "embedding_batch_fill_ratio",
+    "Texts per embedding call relative to EMBED_BATCH_SIZE",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+)
+QUEUE_SECONDS = Histogram(
+    "embedding_batch_queue_seconds",
+    "Time an embedding request waited before its batch was sent",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 30)
+)
+REJECTED = Counter("embedding_batch_rejected_total", "Embedding requests that gave up", ["reason"])
+
+
+class EmbeddingTimeout(Exception):
+    pass
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Merges concurrent embedding calls from worker threads into micro-batches.
+
+    A batch is sent once it holds `max_batch_size` texts or its oldest request
+    has waited `max_wait` seconds. Callers block while `max_queued` texts are
+    already waiting, and raise EmbeddingTimeout after `timeout` seconds.
+    Queries share batches with documents, the Ollama model embeds both alike.
+    """
+
+    def __init__(self, embeddings, max_batch_size=EMBED_BATCH_SIZE, max_wait=EMBED_BATCH_WAIT_MS / 1000,
+                 max_queued=EMBED_MAX_QUEUED, timeout=EMBED_TIMEOUT):
+        self.embeddings = embeddings
+        # Keeps the embedding cache keyed by the wrapped model's name
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        self._pending = deque()
+        self._queued = 0
+        self._worker = None
+
+    def _submit(self, texts):
+        deadline = time.monotonic() + self.timeout
+        futures = []
+        with self._condition:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+            # An oversized request is still accepted once the queue is empty
+            while self._queued and self._queued + len(texts) > self.max_queued:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    REJECTED.labels("queue_full").inc()
+                    raise EmbeddingTimeout(f"{self._queued} texts already queued for embedding")
+                self._condition.wait(remaining)
+            now = time.monotonic()
+            for start in range(0, len(texts), self.max_batch_size):
+                future = Future()
+                self._pending.append((texts[start:start + self.max_batch_size], future, now))
+                futures.append(future)
+            self._queued += len(texts)
+            self._condition.notify_all()
+        vectors = []
+        for future in futures:
+            try:
+                vectors.extend(future.result(timeout=max(deadline - time.monotonic(), 0)))
+            except FutureTimeoutError:
+                # Slices that have not been sent yet are dropped from their batch
+                for pending in futures:
+                    pending.cancel()
+                REJECTED.labels("timeout").inc()
+                raise EmbeddingTimeout(f"Embedding {len(texts)} texts took longer than {self.timeout}s")
+        return vectors
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+            oldest = self._pending[0][2]
+            while self._queued < self.max_batch_size:
+                remaining = oldest + self.max_wait - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch = []
+            size = 0
+            while self._pending and size + len(self._pending[0][0]) <= self.max_batch_size:
+                texts, future, enqueued = self._pending.popleft()
+                batch.append((texts, future, enqueued))
+                size += len(texts)
+            self._queued -= size
+            # Wake callers blocked on a full queue
+            self._condition.notify_all()
+        return batch
+
+    def _run(self):
+        while True:
+            batch = [item for item in self._next_batch() if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            now = time.monotonic()
+            texts = []
+            for slice_texts, _, enqueued in batch:
+                QUEUE_SECONDS.observe(now - enqueued)
+                texts.extend(slice_texts)
+            BATCH_FILL.observe(len(texts) / self.max_batch_size)
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for slice_texts, future, _ in batch:
+                future.set_result(vectors[offset:offset + len(slice_texts)])
+                offset += len(slice_texts)
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        return self._submit(list(texts))
+
+    def embed_query(self, text_value):
+        return self._submit([text_value])[0]
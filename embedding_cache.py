@@ -0,0 +1,105 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from sqlalchemy import bindparam, text
+
+
+# The embedding_cache table is created by migration 8 (migrations.py)
+SELECT_EMBEDDINGS = text(
+    "SELECT text_hash, embedding FROM embedding_cache WHERE model = :model AND text_hash IN :text_hashes"
+).bindparams(bindparam("text_hashes", expanding=True))
+
+INSERT_EMBEDDING = text(
+    "INSERT INTO embedding_cache (model, text_hash, embedding) VALUES (:model, :text_hash, :embedding) "
+    "ON CONFLICT (model, text_hash) DO NOTHING"
+)
+
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "50000"))
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper with an in-memory LRU tier backed by the
+    `embedding_cache` table, keyed by (model name, SHA-256 of the text).
+    Only texts missing from both tiers reach the wrapped model, in one call.
+    The memory tier holds float32 arrays (4 KB for 1024 dimensions, a list of
+    Python floats takes about eight times that); callers still get lists.
+    """
+
+    def __init__(self, embeddings, engine, model_name=None, max_entries=EMBEDDING_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.engine = engine
+        self.model_name = model_name or getattr(embeddings, "model", type(embeddings).__name__)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _hash(text_value):
+        return hashlib.sha256(text_value.encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _embed(self, texts, model_name, embed):
+        hashes = [self._hash(text_value) for text_value in texts]
+        found = {}
+        with self._lock:
+            for text_hash in hashes:
+                key = (model_name, text_hash)
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[text_hash] = self._memory[key]
+            self.memory_hits += len(found)
+
+        missing = [text_hash for text_hash in dict.fromkeys(hashes) if text_hash not in found]
+        if missing:
+            with self.engine.connect() as connection:
+                rows = connection.execute(SELECT_EMBEDDINGS, {"model": model_name, "text_hashes": missing}).all()
+            for row in rows:
+                vector = np.frombuffer(row.embedding, dtype=np.float32).copy()
+                found[row.text_hash] = vector
+                self._remember((model_name, row.text_hash), vector)
+            with self._lock:
+                self.store_hits += len(rows)
+
+        to_embed = {text_hash: text_value for text_hash, text_value in zip(hashes, texts) if text_hash not in found}
+        if to_embed:
+            vectors = embed(list(to_embed.values()))
+            params = []
+            for text_hash, vector in zip(to_embed, vectors):
+                vector = np.asarray(vector, dtype=np.float32)
+                found[text_hash] = vector
+                self._remember((model_name, text_hash), vector)
+                params.append({
+                    "model": model_name,
+                    "text_hash": text_hash,
+                    "embedding": vector.tobytes(),
+                })
+            with self.engine.begin() as connection:
+                connection.execute(INSERT_EMBEDDING, params)
+            with self._lock:
+                self.misses += len(to_embed)
+        return [found[text_hash].tolist() for text_hash in hashes]
+
+    def embed_documents(self, texts):
+        return self._embed(texts, self.model_name, self.embeddings.embed_documents)
+
+    def embed_query(self, text_value):
+        # Queries get their own key space, some models embed them differently
+        return self._embed([text_value], f"{self.model_name}:query", lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+    def stats(self):
+        with self._lock:
+            return {"memory_hits": self.memory_hits, "store_hits": self.store_hits, "misses": self.misses}
@@ -0,0 +1,20 @@
+import threading
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    # Probes and scrapes arrive every few seconds, keep them out of the log
+    def log_message(self, format, *args):
+        pass
+
+
+def start_wsgi_server(port, app, address=''):
+    """Serve a WSGI app (health probes, metrics) from a daemon thread."""
+    server = make_server(address, port, app, _ThreadingWSGIServer, handler_class=_QuietHandler)
+    threading.Thread(target=server.serve_forever, name='health-server', daemon=True).start()
+    return server
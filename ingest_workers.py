@@ -0,0 +1,248 @@
+import threading
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, wait
+
+
+class KeyedExecutor:
+    """
+    Runs tasks on an executor while keeping tasks that share a key in
+    submission order. Tasks with disjoint keys run concurrently.
+
+    A task is only handed to the executor once the previous task of each of
+    its keys has finished (from that task's done-callback), so a chain of
+    tasks on one key never holds more than one pool thread.
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+        self._lock = threading.Lock()
+        self._tails = {}
+        self._outstanding = set()
+
+    def submit(self, keys, fn, *args):
+        keys = [key for key in dict.fromkeys(keys) if key is not None]
+        future = Future()
+        with self._lock:
+            previous = [self._tails[key] for key in keys if key in self._tails]
+            for key in keys:
+                self._tails[key] = future
+            self._outstanding.add(future)
+        future.add_done_callback(lambda done: self._release(keys, done))
+        waiting = [len(previous)]
+
+        def on_previous_done(_):
+            with self._lock:
+                waiting[0] -= 1
+                ready = waiting[0] == 0
+            if ready:
+                self._start(future, fn, args)
+
+        if not previous:
+            self._start(future, fn, args)
+        for predecessor in previous:
+            predecessor.add_done_callback(on_previous_done)
+        return future
+
+    def busy(self, keys):
+        """Whether a task of any of `keys` is still outstanding."""
+        with self._lock:
+            return any(key in self._tails for key in keys)
+
+    def _start(self, future, fn, args):
+        try:
+            task = self.executor.submit(fn, *args)
+        except RuntimeError as e:
+            # The executor was shut down before the task's turn came
+            future.set_exception(e)
+            return
+        task.add_done_callback(lambda done: _copy_outcome(done, future))
+
+    def _release(self, keys, future):
+        with self._lock:
+            self._outstanding.discard(future)
+            for key in keys:
+                if self._tails.get(key) is future:
+                    del self._tails[key]
+
+    def shutdown(self):
+        # Chained tasks are submitted by their predecessors, so wait for all of
+        # them before the executor stops accepting work
+        while True:
+            with self._lock:
+                outstanding = list(self._outstanding)
+            if not outstanding:
+                break
+            wait(outstanding)
+        self.executor.shutdown(wait=True)
+
+
+def _copy_outcome(source, target):
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+class OffsetTracker:
+    """
+    Tracks in-flight Kafka offsets per partition so that an offset is only
+    committed once it and every earlier offset of its partition are done.
+
+    Completions are counted, so an offset that is delivered twice needs both
+    copies to finish. `revoke()` forgets partitions taken away by a rebalance;
+    `track()` returns a generation and completions of an older generation are
+    ignored. Positions stay committable until `committed()` acknowledges them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._done = {}
+        self._positions = {}
+        self._generations = {}
+
+    def track(self, topic, partition, offset):
+        with self._lock:
+            self._pending.setdefault((topic, partition), deque()).append(offset)
+            return self._generations.get((topic, partition), 0)
+
+    def complete(self, topic, partition, offset, generation=0):
+        with self._lock:
+            if generation != self._generations.get((topic, partition), 0):
+                return
+            self._done.setdefault((topic, partition), Counter())[offset] += 1
+
+    def committable(self):
+        """Return (topic, partition, next_offset) for every partition whose completed prefix is not committed yet."""
+        with self._lock:
+            for key, pending in self._pending.items():
+                done = self._done.get(key, Counter())
+                while pending and done[pending[0]]:
+                    offset = pending.popleft()
+                    done[offset] -= 1
+                    if not done[offset]:
+                        del done[offset]
+                    self._positions[key] = offset + 1
+            return [(topic, partition, offset) for (topic, partition), offset in self._positions.items()]
+
+    def committed(self, offsets):
+        with self._lock:
+            for topic, partition, offset in offsets:
+                if self._positions.get((topic, partition)) == offset:
+                    del self._positions[(topic, partition)]
+
+    def revoke(self, partitions):
+        with self._lock:
+            for key in partitions:
+                self._pending.pop(key, None)
+                self._done.pop(key, None)
+                self._positions.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(pending) for pending in self._pending.values())
+
+
+class TenantScheduler:
+    """
+    Per-tenant FIFO queues served round-robin, so a tenant with a large
+    backlog only gets its turn like every other tenant with queued work.
+
+    `get()` takes an optional `ready` predicate; items it rejects stay queued
+    and the first accepted item of the next tenant in turn is returned.
+    """
+
+    def __init__(self):
+        self._queues = OrderedDict()
+        self._size = 0
+
+    def put(self, tenant, item):
+        self._queues.setdefault(tenant, deque()).append(item)
+        self._size += 1
+
+    def get(self, ready=None):
+        """Return the next ready item, or None when no queued item is ready."""
+        for tenant, queue in self._queues.items():
+            for index, item in enumerate(queue):
+                if ready is None or ready(item):
+                    del queue[index]
+                    self._size -= 1
+                    if queue:
+                        self._queues.move_to_end(tenant)
+                    else:
+                        del self._queues[tenant]
+                    return item
+        return None
+
+    def items(self):
+        """Return (tenant, item) for every queued item."""
+        return [(tenant, item) for tenant, queue in self._queues.items() for item in queue]
+
+    def remove(self, predicate):
+        """Drop queued items matching `predicate` and return them."""
+        removed = []
+        for tenant, queue in list(self._queues.items()):
+            kept = deque()
+            for item in queue:
+                (removed if predicate(item) else kept).append(item)
+            if kept:
+                self._queues[tenant] = kept
+            else:
+                del self._queues[tenant]
+        self._size -= len(removed)
+        return removed
+
+    def __len__(self):
+        return self._size
+
+
+class FlowController:
+    """
+    Decides when the consumer pauses and resumes its partitions.
+
+    `max_queued` bounds the queue of each tenant. The bound shrinks as the
+    moving average of message processing time grows past `target_seconds`,
+    so a slow database or model server stops fetching early instead of piling
+    up work. Only the partitions a full tenant's messages came from are
+    paused, and they resume once that tenant has drained to half the bound.
+    """
+
+    def __init__(self, max_queued, target_seconds, alpha=0.2):
+        self.max_queued = max_queued
+        self.target_seconds = target_seconds
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._average = None
+
+    def observe(self, seconds):
+        with self._lock:
+            if self._average is None:
+                self._average = seconds
+            else:
+                self._average += self.alpha * (seconds - self._average)
+
+    def limit(self):
+        with self._lock:
+            average = self._average
+        if not average or average <= self.target_seconds:
+            return self.max_queued
+        return max(1, int(self.max_queued * self.target_seconds / average))
+
+    def should_pause(self, queued):
+        return queued >= self.limit()
+
+    def should_resume(self, queued):
+        return queued <= self.limit() // 2
+
+    def paused_partitions(self, queued, paused):
+        """
+        Return the partitions to keep paused, given a (tenant, partition) pair
+        per queued message and the currently paused partitions.
+        """
+        counts = Counter(tenant for tenant, _ in queued)
+        pause = set()
+        for tenant, partition in queued:
+            if self.should_pause(counts[tenant]) or (partition in paused and not self.should_resume(counts[tenant])):
+                pause.add(partition)
+        return pause
@@ -0,0 +1,170 @@
+import os
+import re
+
+from sqlalchemy import create_engine, text
+
+
+# Dimension of the embedding model (bge-m3), needed to index vector columns
+EMBEDDING_DIM = int(os.environ.get("EMBEDDING_DIM", "1024"))
+
+# Run pending migrations when the API and the builder start; with 0 they are
+# left to `python migrations.py`, run once per deployment
+MIGRATE_ON_STARTUP = os.environ.get("MIGRATE_ON_STARTUP", "1") == "1"
+
+# Ordered schema migrations: (version, name, tables that must already exist, statements).
+# A migration whose tables are missing (e.g. the PGVector tables before the
+# builder first ran) is deferred, later migrations that do not need them still
+# run. A migration therefore lists every table its statements depend on.
+# Indexes are built CONCURRENTLY, outside of a transaction, so writes to the
+# table carry on while they build.
+MIGRATIONS = [
+    (1, "hot path indexes", ["category", "knowledge", "knowledge_file_info"], [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_category_category_id ON category (category_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_category_parent_id ON category (parent_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_knowledge_chunk_id ON knowledge (chunk_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_knowledge_file_id ON knowledge (file_id, id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_knowledge_category_id ON knowledge (category_id, id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_knowledge_file_info_hash_value ON knowledge_file_info (hash_value)",
+        # text_pattern_ops serves both equality and the prefix LIKE used to de-duplicate file names
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_knowledge_file_info_file_name ON knowledge_file_info (file_name text_pattern_ops)",
+    ]),
+    (2, "hnsw index on category vectors", ["langchain_pg_embedding"], [
+        f"ALTER TABLE langchain_pg_embedding ALTER COLUMN embedding TYPE vector({EMBEDDING_DIM})",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_langchain_pg_embedding_hnsw ON langchain_pg_embedding "
+        "USING hnsw (embedding vector_cosine_ops)",
+    ]),
+    (3, "idempotent ingestion", ["knowledge"], [
+        # Deterministic chunk IDs make re-inserting a chunk an upsert no-op
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ux_knowledge_chunk_id ON knowledge (chunk_id)",
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_knowledge_chunk_id",
+        """
+        CREATE TABLE IF NOT EXISTS ingest_progress (
+            file_id VARCHAR(255) NOT NULL,
+            category_id VARCHAR(255) NOT NULL,
+            next_chunk_index INTEGER NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (file_id, category_id)
+        )
+        """,
+    ]),
+    (4, "tenant metadata on category vectors", ["langchain_pg_embedding", "category"], [
+        """
+        UPDATE langchain_pg_embedding e
+        SET cmetadata = e.cmetadata || jsonb_build_object('tenant', c.tenant)
+        FROM category c
+        WHERE c.category_id = e.id AND c.tenant IS NOT NULL AND NOT (e.cmetadata ? 'tenant')
+        """,
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_langchain_pg_embedding_tenant ON langchain_pg_embedding ((cmetadata->>'tenant'))",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_category_tenant ON category (tenant)",
+    ]),
+    # The vector extension is installed by PGVector together with its tables
+    (5, "stored chunk embeddings", ["langchain_pg_embedding", "knowledge"], [
+        f"ALTER TABLE knowledge ADD COLUMN IF NOT EXISTS embedding vector({EMBEDDING_DIM})",
+    ]),
+    (6, "hnsw index on chunk vectors", ["langchain_pg_embedding", "knowledge"], [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_knowledge_embedding_hnsw ON knowledge "
+        "USING hnsw (embedding vector_cosine_ops)",
+    ]),
+    # Status of the API's background category deletes, shared by its replicas
+    (7, "delete jobs", [], [
+        """
+        CREATE TABLE IF NOT EXISTS delete_jobs (
+            job_id UUID PRIMARY KEY,
+            category_id VARCHAR(255) NOT NULL,
+            category_count INTEGER NOT NULL,
+            status VARCHAR(16) NOT NULL,
+            deleted_count INTEGER,
+            error TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """,
+    ]),
+    # Embeddings shared by the API and the builder (embedding_cache.py)
+    (8, "embedding cache", [], [
+        """
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            model VARCHAR(255) NOT NULL,
+            text_hash CHAR(64) NOT NULL,
+            embedding BYTEA NOT NULL,
+            PRIMARY KEY (model, text_hash)
+        )
+        """,
+    ]),
+]
+
+CREATE_VERSION_TABLE = text("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+""")
+
+# Serialises concurrent runners (API and builder replicas starting together)
+MIGRATION_LOCK_ID = 72310411
+
+
+# A failed CREATE INDEX CONCURRENTLY leaves an invalid index behind, which
+# IF NOT EXISTS would then accept
+INVALID_INDEX_QUERY = text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)")
+CONCURRENT_INDEX = re.compile(r"CREATE (?:UNIQUE )?INDEX CONCURRENTLY IF NOT EXISTS (\w+)")
+
+
+def _run_concurrently(connection, statement):
+    # CONCURRENTLY cannot run inside a transaction block
+    connection.commit()
+    connection.execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        match = CONCURRENT_INDEX.match(statement.strip())
+        if match and connection.execute(INVALID_INDEX_QUERY, {"name": match.group(1)}).scalar():
+            print(f"Rebuilding invalid index {match.group(1)}")
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {match.group(1)}"))
+        connection.execute(text(statement))
+    finally:
+        # Ends the autobegun (no-op) transaction so the level can be restored
+        connection.rollback()
+        connection.execution_options(isolation_level=connection.default_isolation_level)
+
+
+def run_migrations(connection):
+    """
+    Apply pending migrations on `connection`, which must not be inside a
+    transaction: each migration is committed on its own and index builds run
+    in autocommit mode. A session-level advisory lock serialises runners.
+    """
+    connection.execute(text("SELECT pg_advisory_lock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+    connection.commit()
+    try:
+        connection.execute(CREATE_VERSION_TABLE)
+        applied = set(connection.execute(text("SELECT version FROM schema_migrations")).scalars())
+        connection.commit()
+        for version, name, required_tables, statements in MIGRATIONS:
+            if version in applied:
+                continue
+            if any(connection.execute(text("SELECT to_regclass(:table)"), {"table": table}).scalar() is None for table in required_tables):
+                print(f"Deferring migration {version} ({name}) until {', '.join(required_tables)} exists")
+                connection.commit()
+                continue
+            for statement in statements:
+                if " CONCURRENTLY " in statement:
+                    _run_concurrently(connection, statement)
+                else:
+                    connection.execute(text(statement))
+            connection.execute(
+                text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                {"version": version, "name": name}
+            )
+            connection.commit()
+            print(f"Applied migration {version} ({name})")
+    finally:
+        connection.rollback()
+        connection.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+        connection.commit()
+
+
+if __name__ == "__main__":
+    from env import DATABASE_URL
+
+    with create_engine(DATABASE_URL).connect() as migrate_connection:
+        run_migrations(migrate_connection)
@@ -1,14 +1,26 @@
-from fastapi import FastAPI, UploadFile, File, Body, HTTPException
-from sqlalchemy import create_engine, Column, String, Integer, VARCHAR, UUID
+from fastapi import APIRouter, FastAPI, UploadFile, File, Body, HTTPException, Query
+from sqlalchemy import Column, String, Integer, VARCHAR, UUID, create_engine, select, or_, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from fastapi.responses import JSONResponse
+from fastapi import Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Gauge, Histogram, generate_latest
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional, Dict
-from uuid import UUID as PyUUID
+from uuid import UUID as PyUUID, uuid4
 from pydantic import BaseModel
 import os# print(cleaned_chunks)
 import hashlib
+import tempfile
+import json
+import asyncio
+import time
 from env import DATABASE_URL
+from category_hierarchy import CategoryHierarchy, COUNT_SUBTREE_QUERY, DELETE_SUBTREE_QUERY
+from migrations import MIGRATE_ON_STARTUP, run_migrations
+from embedding_cache import CachedEmbeddings
+from embedding_batcher import BatchingEmbeddings
+from langchain_ollama import OllamaEmbeddings
 from fastapi.openapi.docs import (
     get_redoc_html,
     get_swagger_ui_html,
@@ -16,11 +28,32 @@ from fastapi.openapi.docs import (
 )   
 
 
-app = FastAPI()
+router = APIRouter()
 
 
-# Create a PostgreSQL engine
-engine = create_engine(DATABASE_URL)
+REQUEST_SECONDS = Histogram(
+    "ontology_api_request_seconds",
+    "Latency of API requests",
+    ["method", "route", "status"]
+)
+STARTUP_SECONDS = Gauge("ontology_api_startup_seconds", "Time warm_up() took to create and warm up the resources")
+
+
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template so path parameters do not explode the label set
+    route = request.scope.get("route")
+    REQUEST_SECONDS.labels(request.method, route.path if route else "unmatched", response.status_code).observe(time.perf_counter() - start)
+    return response
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
 Base = declarative_base()
 
 
@@ -51,8 +84,113 @@ class Category(Base):
     category_id = Column(VARCHAR(255))
     parent_id = Column(VARCHAR(255))
     tenant = Column(String)
-Base.metadata.create_all(engine)
-Session = sessionmaker(bind=engine)
+category_hierarchy = CategoryHierarchy()
+# The async engine, its sessions and the query embeddings are created by
+# warm_up(), so importing the module does not touch PostgreSQL or Ollama.
+# The cache is synchronous, so it gets a small engine of its own and is only
+# called from the threadpool, where concurrent cache misses are merged into
+# micro-batches.
+engine = None
+Session = None
+query_embeddings = None
+startup_seconds = None
+warm_up_task = None
+# Answered while warm_up() runs, every other route waits for it
+PROBE_PATHS = {"/livez", "/readyz", "/metrics"}
+
+
+async def warm_up():
+    """
+    Create the async engine and the schema, run the migrations, open
+    DB_POOL_SIZE pool connections so the first requests do not pay for them,
+    and set up the query embeddings. /readyz reports ready once this has
+    finished.
+    """
+    global engine, Session, query_embeddings, startup_seconds
+    start = time.perf_counter()
+    os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
+    # An async engine so database calls never block the event loop
+    engine = create_async_engine(
+        DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", "20")),
+        pool_timeout=float(os.environ.get("DB_POOL_TIMEOUT", "30")),
+        pool_recycle=int(os.environ.get("DB_POOL_RECYCLE", "1800")),
+        pool_pre_ping=True,
+    )
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    if MIGRATE_ON_STARTUP:
+        # Migrations manage their own transactions, index builds run outside of one
+        async with engine.connect() as connection:
+            await connection.run_sync(run_migrations)
+    connections = await asyncio.gather(*(engine.connect() for _ in range(DB_POOL_SIZE)))
+    await asyncio.gather(*(connection.execute(text("SELECT 1")) for connection in connections))
+    await asyncio.gather(*(connection.close() for connection in connections))
+    query_embeddings = CachedEmbeddings(
+        BatchingEmbeddings(OllamaEmbeddings(model="bge-m3:latest")), create_engine(DATABASE_URL, pool_size=2, max_overflow=2)
+    )
+    startup_seconds = time.perf_counter() - start
+    STARTUP_SECONDS.set(startup_seconds)
+    print(f"API ready in {startup_seconds:.2f}s")
+
+
+def warm_up_error():
+    if warm_up_task is None or not warm_up_task.done() or warm_up_task.cancelled():
+        return None
+    return warm_up_task.exception()
+
+
+def report_warm_up(task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"API warm-up failed: {task.exception()}")
+
+
+async def startup():
+    """
+    Start warm_up() in the background. uvicorn only binds its socket once the
+    startup handlers have returned, so /livez answers (and /readyz reports
+    "starting") while migrations and index builds are still running.
+    """
+    global warm_up_task
+    warm_up_task = asyncio.create_task(warm_up())
+    warm_up_task.add_done_callback(report_warm_up)
+
+
+async def shutdown():
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+        await asyncio.gather(warm_up_task, return_exceptions=True)
+    if engine is not None:
+        await engine.dispose()
+
+
+async def require_ready(request: Request, call_next):
+    # Routes other than the probes need the resources warm_up() creates
+    if startup_seconds is None and request.url.path not in PROBE_PATHS:
+        return JSONResponse(status_code=503, content={"detail": "Service is starting"})
+    return await call_next(request)
+
+
+@router.get("/livez", include_in_schema=False)
+async def liveness():
+    # A failed warm-up is only fixed by a restart
+    error = warm_up_error()
+    if error is not None:
+        return JSONResponse(status_code=503, content={"status": "warm-up failed", "error": str(error)})
+    return {"status": "alive"}
+
+
+@router.get("/readyz", include_in_schema=False)
+async def readiness():
+    # Ready once warm_up() has created the schema and warmed the pool
+    if startup_seconds is None:
+        error = warm_up_error()
+        if error is not None:
+            return JSONResponse(status_code=503, content={"status": "warm-up failed", "error": str(error)})
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready", "startup_seconds": startup_seconds, "pool": engine.pool.status()}
 
 
 # Define Pydantic models for requests
@@ -79,6 +217,36 @@ class ChunksResponse(BaseModel):
     not_found_chunk_ids: Optional[List[str]]
 
 
+class ChunkPageResponse(BaseModel):
+    success: bool
+    message: Optional[str]
+    chunk_details: Optional[List[ChunkData]]
+    next_cursor: Optional[int]
+
+
+class SearchRequest(BaseModel):
+    query: str
+    tenant: Optional[str] = None
+    category_id: Optional[str] = None
+    limit: int = 10
+    offset: int = 0
+
+
+class SearchResult(BaseModel):
+    chunk_id: str
+    file_id: str
+    category_id: str
+    text: str
+    score: float
+
+
+class SearchResponse(BaseModel):
+    success: bool
+    message: Optional[str]
+    results: Optional[List[SearchResult]]
+    next_offset: Optional[int]
+
+
 class UpdateCategoryRequest(BaseModel):
     chunk_id: str
     category_id: str
@@ -95,29 +263,85 @@ class UpdateCategoryResponse(BaseModel):
 class DeleteCategoryRequest(BaseModel):
     category_id: str
 UPLOAD_DIRECTORY = "knowledge_files"
-os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
-
-
-
-def all_categories(category_id):
-    session = Session()
-    all_category = []
-    category_object = session.query(Category).filter(Category.parent_id == category_id).all()
-    if category_object is not None:
-        for category in category_object:
-            all_category.append(category.category_id)
-            all_category.extend(all_categories(category.category_id))
-    return all_category
-
-
-
-@app.post("/files", tags=["files"])
+# Uploads are streamed in chunks of this size and rejected past MAX_UPLOAD_BYTES
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Rows fetched per query when streaming or paging through chunks
+CHUNK_STREAM_BATCH_SIZE = int(os.environ.get("CHUNK_STREAM_BATCH_SIZE", "500"))
+MAX_CHUNK_PAGE_SIZE = 1000
+# /search pages through at most this many nearest chunks (offset + limit), which
+# is also the HNSW candidate list size (hnsw.ef_search) of the deepest page
+SEARCH_MAX_RESULTS = int(os.environ.get("SEARCH_MAX_RESULTS", "1000"))
+MAX_SEARCH_PAGE_SIZE = 100
+# pgvector >= 0.8 keeps scanning the HNSW index until enough rows pass the tenant
+# and subtree filters; empty for older pgvector versions
+SEARCH_ITERATIVE_SCAN = os.environ.get("SEARCH_ITERATIVE_SCAN", "relaxed_order")
+# What happens to knowledge rows of deleted categories: "reparent" moves them to the
+# parent of the deleted category (kept as-is for root categories), "delete" removes
+# them and "keep" leaves them untouched
+ORPHAN_KNOWLEDGE_POLICY = os.environ.get("ORPHAN_KNOWLEDGE_POLICY", "reparent")
+# Subtrees larger than this are deleted by a background job
+DELETE_BACKGROUND_THRESHOLD = int(os.environ.get("DELETE_BACKGROUND_THRESHOLD", "500"))
+CATEGORY_COLLECTION = "categoryInfo"
+
+DELETE_CATEGORY_VECTORS = text("""
+    DELETE FROM langchain_pg_embedding
+    WHERE id = ANY(:category_ids)
+      AND collection_id = (SELECT uuid FROM langchain_pg_collection WHERE name = :collection_name)
+""")
+REPARENT_KNOWLEDGE = text("UPDATE knowledge SET category_id = :parent_id WHERE category_id = ANY(:category_ids)")
+DELETE_KNOWLEDGE = text("DELETE FROM knowledge WHERE category_id = ANY(:category_ids)")
+
+# Status of background delete jobs, kept in the delete_jobs table so any
+# replica can answer GET /deleteCategory/{job_id}
+INSERT_DELETE_JOB = text("""
+    INSERT INTO delete_jobs (job_id, category_id, category_count, status)
+    VALUES (:job_id, :category_id, :category_count, 'pending')
+""")
+UPDATE_DELETE_JOB = text("""
+    UPDATE delete_jobs
+    SET status = :status, deleted_count = :deleted_count, error = :error, updated_at = now()
+    WHERE job_id = :job_id
+""")
+SELECT_DELETE_JOB = text("""
+    SELECT status, category_id, category_count, deleted_count, error
+    FROM delete_jobs WHERE job_id = :job_id
+""")
+background_tasks = set()
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(500 * 1024 * 1024)))
+
+
+def claim_file_name(temp_path, file_name, taken_file_names):
+    """
+    Link the upload into UPLOAD_DIRECTORY under the first free name, trying
+    "name.pdf", then "name(1).pdf", ... while skipping names already in the
+    database. os.link fails when the target exists, so concurrent uploads of
+    the same name never overwrite each other. Returns the claimed name.
+    """
+    file_stem, file_extension = os.path.splitext(file_name)
+    file_extension = file_extension.lower()
+    new_file_name = file_name
+    counter = 1
+    while True:
+        if new_file_name not in taken_file_names:
+            try:
+                os.link(temp_path, os.path.join(UPLOAD_DIRECTORY, new_file_name))
+                return new_file_name
+            except FileExistsError:
+                pass
+        new_file_name = f"{file_stem}({counter}){file_extension}"
+        counter += 1
+
+
+
+@router.post("/files", tags=["files"])
 async def upload_file(file: UploadFile = File(...),file_id: str = Body(...),hash_value: str = Body(...)) -> UploadFilesApiResponse:
     """
     Upload files to the server, validate their content, and store metadata in the database.
     
     This endpoint accepts one or more files, checks their extension and hash value,
-    and stores them in a local directory. If a file with the same hash value already 
+    and stores them in a local directory. The upload is streamed to a temporary file
+    while its hash is computed, and only linked into place once it is validated,
+    so memory use does not grow with the file size. If a file with the same hash value already 
     exists, it prevents duplication. Additionally, it ensures that each file's name 
     is unique in the database. If a file name conflict is detected, it appends a 
     counter to the filename to resolve the conflict.
@@ -137,51 +361,68 @@ async def upload_file(file: UploadFile = File(...),file_id: str = Body(...),hash
     allowed_extensions = {".pdf"}
     original_file_name = file.filename
     file_extension = os.path.splitext(original_file_name)[1].lower()
+    temp_path = None
     try:
         # Check if the file extension is allowed
         if file_extension not in allowed_extensions:
             return UploadFilesApiResponse(success=False, message="Provided file type is not valid.", file_name=original_file_name)
         
-        # Read file content into memory
-        file_content = await file.read()
-        generated_hash_value = hashlib.sha256(file_content).hexdigest()
+        # Stream the upload to a temporary file, hashing it chunk by chunk
+        hasher = hashlib.sha256()
+        file_size = 0
+        fd, temp_path = await run_in_threadpool(tempfile.mkstemp, dir=UPLOAD_DIRECTORY, suffix=".part")
+        temp_file = os.fdopen(fd, "wb")
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                file_size += len(chunk)
+                if file_size > MAX_UPLOAD_BYTES:
+                    return UploadFilesApiResponse(success=False, message=f"File exceeds the maximum size of {MAX_UPLOAD_BYTES} bytes.", file_name=original_file_name)
+                hasher.update(chunk)
+                await run_in_threadpool(temp_file.write, chunk)
+        finally:
+            await run_in_threadpool(temp_file.close)
+        generated_hash_value = hasher.hexdigest()
         
         # Check if the provided hash_value matches the calculated hash_value
         if hash_value != generated_hash_value:
             return UploadFilesApiResponse(success=False, message="Provided hash value does not match the calculated hash value.", file_name=original_file_name)
         
-        existing_file = session.query(Files).filter(Files.hash_value == hash_value).first()
+        existing_file = await session.scalar(select(Files).where(Files.hash_value == hash_value).limit(1))
         
         if existing_file:
             return UploadFilesApiResponse(success=False, message="File already exists.", file_name=existing_file.file_name)
-        # Check if the file name already exists in the database
-        existing_file = session.query(Files).filter(Files.file_name == original_file_name).first()
-        new_file_name = original_file_name
-        
-        # If the file name exists, rename it
-        counter = 1
-        while existing_file:
-            new_file_name = f"{os.path.splitext(original_file_name)[0]}({counter}){file_extension}"
-            existing_file = session.query(Files).filter(Files.file_name == new_file_name).first()
-            counter += 1
+        # Fetch the original name and all of its "name(n).pdf" variants in one query
+        file_stem = os.path.splitext(original_file_name)[0]
+        escaped_stem = file_stem.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        taken_file_names = set((await session.scalars(select(Files.file_name).where(or_(
+            Files.file_name == original_file_name,
+            Files.file_name.like(f"{escaped_stem}(%){file_extension}", escape="\\")
+        )))).all())
+        # If the file name exists, rename it; the file on disk is the name's lock
+        new_file_name = await run_in_threadpool(claim_file_name, temp_path, original_file_name, taken_file_names)
+        file_location = os.path.join(UPLOAD_DIRECTORY, new_file_name)
         
         # Create a new file record
         new_file = Files(file_name=new_file_name, file_id=file_id, hash_value=hash_value, status="0")
         session.add(new_file)
-        # Save the file to the local directory
-        file_location = os.path.join(UPLOAD_DIRECTORY, new_file_name)
-        with open(file_location, "wb") as f:
-            f.write(file_content)  # Write the content read into memory
-            
-        session.commit()
+        try:
+            await session.commit()
+        except Exception:
+            await run_in_threadpool(os.remove, file_location)
+            raise
         return UploadFilesApiResponse(success=True, message="File uploaded successfully", file_name=new_file_name)
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         return UploadFilesApiResponse(success=False, message=f"error: {str(e)}", file_name=None)
+    finally:
+        # Drop the partial upload on every early return or failure
+        if temp_path is not None and os.path.exists(temp_path):
+            await run_in_threadpool(os.remove, temp_path)
+        await session.close()
     
 
 
-@app.post("/chunks", tags=["chunks"])
+@router.post("/chunks", tags=["chunks"])
 async def get_chunks(chunk_request: ChunkRequest) -> ChunksResponse:
     """
     Retrieve text chunks from the database based on the provided chunk IDs.
@@ -210,7 +451,7 @@ async def get_chunks(chunk_request: ChunkRequest) -> ChunksResponse:
         # Convert string UUIDs to UUID instances
         uuid_chunk_ids_for_validations = set(PyUUID(chunk_id) for chunk_id in chunk_ids)
         uuid_chunk_ids = [PyUUID(chunk_id) for chunk_id in chunk_ids]
-        chunks = session.query(Knowledge).filter(Knowledge.chunk_id.in_(uuid_chunk_ids)).all()
+        chunks = (await session.scalars(select(Knowledge).where(Knowledge.chunk_id.in_(uuid_chunk_ids)))).all()
         # Prepare the result as a dictionary with chunk IDs as keys and text as values
         result = [ChunkData(chunk_id=str(chunk.chunk_id), file_id=chunk.file_id, text=chunk.text)for chunk in chunks]
         # Create a set of chunk IDs retrieved from the database
@@ -227,11 +468,184 @@ async def get_chunks(chunk_request: ChunkRequest) -> ChunksResponse:
     except Exception as e:
         return ChunksResponse(success=False, message=f"error: {str(e)}", chunk_details=None, not_found_chunk_ids=None)
     finally:
-        session.close()
+        await session.close()
 
 
 
-@app.put("/updateCategory", tags=["updateCategory"])
+@router.post("/chunks/stream", tags=["chunks"])
+async def stream_chunks(chunk_request: ChunkRequest):
+    """
+    Stream text chunks for a large list of chunk IDs as newline-delimited JSON.
+    The IDs are looked up in batches of CHUNK_STREAM_BATCH_SIZE, so neither the
+    server nor the client has to hold the whole result in memory.
+    Args:
+        chunk_request (ChunkRequest): An object containing a list of chunk IDs to retrieve from the database.
+    Returns:
+        StreamingResponse (application/x-ndjson): One ChunkData object per line
+        (chunk_id, file_id, text). If some IDs were not found, the last line is
+        an object with a single not_found_chunk_ids list.
+    """
+    chunk_ids = chunk_request.chunk_ids
+    if not chunk_ids:
+        return ChunksResponse(success=False, message="Chunk IDs must be provided.", chunk_details=None, not_found_chunk_ids=None)
+    try:
+        # Validate every ID before the response starts streaming
+        uuid_chunk_ids = list(dict.fromkeys(PyUUID(chunk_id) for chunk_id in chunk_ids))
+    except ValueError as e:
+        return ChunksResponse(success=False, message=f"error: {str(e)}", chunk_details=None, not_found_chunk_ids=None)
+
+    async def generate():
+        session = Session()
+        missing_chunk_ids = []
+        try:
+            for start in range(0, len(uuid_chunk_ids), CHUNK_STREAM_BATCH_SIZE):
+                batch = uuid_chunk_ids[start:start + CHUNK_STREAM_BATCH_SIZE]
+                chunks = (await session.scalars(select(Knowledge).where(Knowledge.chunk_id.in_(batch)))).all()
+                lines = [ChunkData(chunk_id=str(chunk.chunk_id), file_id=chunk.file_id, text=chunk.text).json() + "\n" for chunk in chunks]
+                yield "".join(lines)
+                retrieved_chunk_ids = set(chunk.chunk_id for chunk in chunks)
+                missing_chunk_ids.extend(str(chunk_id) for chunk_id in batch if chunk_id not in retrieved_chunk_ids)
+                # Release the batch before fetching the next one
+                session.expunge_all()
+            if missing_chunk_ids:
+                yield json.dumps({"not_found_chunk_ids": missing_chunk_ids}) + "\n"
+        finally:
+            await session.close()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+
+@router.get("/chunks", tags=["chunks"])
+async def list_chunks(
+    file_id: Optional[str] = Query(None),
+    category_id: Optional[str] = Query(None),
+    cursor: Optional[int] = Query(None),
+    limit: int = Query(100, ge=1, le=MAX_CHUNK_PAGE_SIZE),
+) -> ChunkPageResponse:
+    """
+    Page through the chunks of a file and/or a category without knowing their chunk IDs.
+    Pages are ordered by the knowledge row id and use keyset pagination, so each page
+    costs the same regardless of how deep into the result it is.
+    Args:
+        file_id: Return chunks of this file.
+        category_id: Return chunks assigned to this category.
+        cursor: The next_cursor of the previous page, omitted for the first page.
+        limit: Maximum number of chunks per page.
+    Returns:
+        ChunkPageResponse: An object containing:
+            - success (bool): Indicates whether the operation was successful.
+            - message (str): A message providing additional context about the response.
+            - chunk_details (List[ChunkData] or None): The chunks of this page.
+            - next_cursor (int or None): Cursor of the next page, None on the last page.
+    """
+    if not file_id and not category_id:
+        return ChunkPageResponse(success=False, message="file_id or category_id must be provided.", chunk_details=None, next_cursor=None)
+    session = Session()
+    try:
+        query = select(Knowledge).order_by(Knowledge.id).limit(limit)
+        if file_id:
+            query = query.where(Knowledge.file_id == file_id)
+        if category_id:
+            query = query.where(Knowledge.category_id == category_id)
+        if cursor is not None:
+            query = query.where(Knowledge.id > cursor)
+        chunks = (await session.scalars(query)).all()
+        result = [ChunkData(chunk_id=str(chunk.chunk_id), file_id=chunk.file_id, text=chunk.text) for chunk in chunks]
+        next_cursor = chunks[-1].id if len(chunks) == limit else None
+        return ChunkPageResponse(success=True, message="Successfully retrieved chunk details.", chunk_details=result, next_cursor=next_cursor)
+    except Exception as e:
+        return ChunkPageResponse(success=False, message=f"error: {str(e)}", chunk_details=None, next_cursor=None)
+    finally:
+        await session.close()
+
+
+
+def build_search_query(tenant, category_ids):
+    # Filters go inside the ANN scan; the outer query restores exact order
+    # (iterative scans may return neighbours slightly out of order) and pages
+    conditions = ["k.embedding IS NOT NULL"]
+    if tenant is not None:
+        conditions.append("k.category_id IN (SELECT category_id FROM category WHERE tenant = :tenant)")
+    if category_ids is not None:
+        conditions.append("k.category_id = ANY(:category_ids)")
+    return text(f"""
+        WITH nearest AS MATERIALIZED (
+            SELECT k.chunk_id, k.file_id, k.category_id, k.text, k.embedding <=> CAST(:query AS vector) AS distance
+            FROM knowledge k
+            WHERE {" AND ".join(conditions)}
+            ORDER BY distance
+            LIMIT :window
+        )
+        SELECT chunk_id, file_id, category_id, text, 1 - distance AS score
+        FROM nearest
+        ORDER BY distance
+        OFFSET :offset LIMIT :limit
+    """)
+
+
+@router.post("/search", tags=["search"])
+async def search_chunks(search_request: SearchRequest) -> SearchResponse:
+    """
+    Return the chunks most similar to a text query, ranked by cosine similarity.
+    The query is embedded once (and cached) and searched with the HNSW index over
+    the stored chunk embeddings, filtered by tenant and category subtree in the
+    same query.
+    Args:
+        search_request (SearchRequest): An object containing:
+            - query (str): The text to search for.
+            - tenant (str, optional): Only return chunks of this tenant's categories.
+            - category_id (str, optional): Only return chunks of this category and its descendants.
+            - limit (int): Results per page, at most MAX_SEARCH_PAGE_SIZE.
+            - offset (int): Number of results to skip, offset + limit is at most SEARCH_MAX_RESULTS.
+    Returns:
+        SearchResponse: An object containing:
+            - success (bool): Indicates whether the operation was successful.
+            - message (str): A message providing additional context about the response.
+            - results (List[SearchResult] or None): chunk_id, file_id, category_id, text and score (cosine similarity) of each chunk, best first.
+            - next_offset (int or None): Offset of the next page, None on the last page.
+    """
+    limit = search_request.limit
+    offset = search_request.offset
+    if not search_request.query.strip():
+        return SearchResponse(success=False, message="query must be provided.", results=None, next_offset=None)
+    if not 1 <= limit <= MAX_SEARCH_PAGE_SIZE or offset < 0 or offset + limit > SEARCH_MAX_RESULTS:
+        return SearchResponse(success=False, message=f"limit must be between 1 and {MAX_SEARCH_PAGE_SIZE} and offset + limit at most {SEARCH_MAX_RESULTS}.", results=None, next_offset=None)
+    session = Session()
+    try:
+        vector = await run_in_threadpool(query_embeddings.embed_query, search_request.query)
+        category_ids = None
+        if search_request.category_id:
+            category_id = search_request.category_id
+            descendants = await session.run_sync(lambda sync_session: category_hierarchy.descendants(sync_session, category_id))
+            category_ids = [category_id] + descendants
+        # The candidate list must cover every row up to the end of the requested page
+        await session.execute(text(f"SET LOCAL hnsw.ef_search = {max(40, offset + limit)}"))
+        if SEARCH_ITERATIVE_SCAN:
+            await session.execute(text(f"SET LOCAL hnsw.iterative_scan = {SEARCH_ITERATIVE_SCAN}"))
+        params = {
+            "query": "[" + ",".join(str(value) for value in vector) + "]",
+            "tenant": search_request.tenant,
+            "category_ids": category_ids,
+            "window": offset + limit,
+            "offset": offset,
+            "limit": limit,
+        }
+        rows = (await session.execute(build_search_query(search_request.tenant, category_ids), params)).all()
+        results = [
+            SearchResult(chunk_id=str(row.chunk_id), file_id=row.file_id, category_id=row.category_id, text=row.text, score=row.score)
+            for row in rows
+        ]
+        next_offset = offset + limit if len(rows) == limit and offset + 2 * limit <= SEARCH_MAX_RESULTS else None
+        return SearchResponse(success=True, message="Successfully searched chunks.", results=results, next_offset=next_offset)
+    except Exception as e:
+        return SearchResponse(success=False, message=f"error: {str(e)}", results=None, next_offset=None)
+    finally:
+        await session.close()
+
+
+
+@router.put("/updateCategory", tags=["updateCategory"])
 async def update_category(update_request: UpdateCategoryRequest) -> UpdateCategoryResponse:
     """
     Update the category ID for a specific chunk ID if it is not already associated.
@@ -246,7 +660,7 @@ async def update_category(update_request: UpdateCategoryRequest) -> UpdateCatego
         chunk_id = update_request.chunk_id
         category_id = update_request.category_id
         # Query to find the Knowledge entry with the given chunk_id
-        knowledge_entry = session.query(Knowledge).filter(Knowledge.chunk_id == chunk_id).first()
+        knowledge_entry = await session.scalar(select(Knowledge).where(Knowledge.chunk_id == chunk_id).limit(1))
         # If the Knowledge entry doesn't exist, raise an error
         if knowledge_entry is None:
             return UpdateCategoryResponse(success=True, message="Chunk ID not found in the database.", chunk_id=chunk_id, category_id=category_id)
@@ -255,39 +669,136 @@ async def update_category(update_request: UpdateCategoryRequest) -> UpdateCatego
             return UpdateCategoryResponse(success=True, message="Category ID is already up to date.", chunk_id=chunk_id, category_id=category_id)
         # If not, update the category ID
         knowledge_entry.category_id = update_request.category_id
-        session.commit()
+        await session.commit()
         return UpdateCategoryResponse(success=True, message="Category ID updated successfully.", chunk_id=chunk_id, category_id=category_id)
     except Exception as e:
-        session.rollback()  # Rollback in case of an error
+        await session.rollback()  # Rollback in case of an error
         return UpdateCategoryResponse(success=False, message=f"error: {str(e)}", chunk_id=None, category_id=None)
     finally:
-        session.close()
+        await session.close()
 
 
         
-@app.delete("/deleteCategory", tags=["deleteCategories"])
+async def delete_subtree(session, category_id):
+    """
+    Delete a category and all of its descendants in a single transaction: one
+    recursive DELETE ... RETURNING for the categories, one batched delete of their
+    categoryInfo vectors and one bulk statement applying ORPHAN_KNOWLEDGE_POLICY.
+    Returns the deleted category IDs.
+    """
+    parent_id = await session.scalar(select(Category.parent_id).where(Category.category_id == category_id).limit(1))
+    deleted_ids = (await session.execute(DELETE_SUBTREE_QUERY, {"category_id": category_id})).scalars().all()
+    if deleted_ids:
+        params = {"category_ids": list(deleted_ids)}
+        await session.execute(DELETE_CATEGORY_VECTORS, {**params, "collection_name": CATEGORY_COLLECTION})
+        if ORPHAN_KNOWLEDGE_POLICY == "delete":
+            await session.execute(DELETE_KNOWLEDGE, params)
+        elif ORPHAN_KNOWLEDGE_POLICY == "reparent" and parent_id:
+            await session.execute(REPARENT_KNOWLEDGE, {**params, "parent_id": parent_id})
+    await session.commit()
+    category_hierarchy.invalidate()
+    return deleted_ids
+
+
+async def update_delete_job(session, job_id, status, deleted_count=None, error=None):
+    await session.execute(UPDATE_DELETE_JOB, {"job_id": job_id, "status": status, "deleted_count": deleted_count, "error": error})
+    await session.commit()
+
+
+async def run_delete_job(job_id, category_id):
+    session = Session()
+    try:
+        await update_delete_job(session, job_id, "running")
+        deleted_ids = await delete_subtree(session, category_id)
+        await update_delete_job(session, job_id, "completed", deleted_count=len(deleted_ids))
+    except Exception as e:
+        await session.rollback()
+        try:
+            await update_delete_job(session, job_id, "failed", error=str(e))
+        except Exception as update_error:
+            print(f"Could not record the failure of delete job {job_id}: {update_error}")
+    finally:
+        await session.close()
+
+
+        
+@router.delete("/deleteCategory", tags=["deleteCategories"])
 async def delete_categories(request: DeleteCategoryRequest):
     """
     Delete the category ID for a specific category_id.
+    The category, all of its descendants and their vectors are removed in one transaction,
+    and their knowledge rows are handled according to ORPHAN_KNOWLEDGE_POLICY.
+    Subtrees larger than DELETE_BACKGROUND_THRESHOLD are deleted by a background job
+    whose status can be polled with GET /deleteCategory/{job_id}.
     Args:
     delete_request: it will take the category_id to delete operation.
     Returns:
-    dict: A message indicating the status of the delete.
+    dict: A message indicating the status of the delete, with the job_id (HTTP 202)
+    when the delete runs in the background.
     """
     category_id = request.category_id  # Get category_id from the request body
     session = Session()
     try:
-        category_ids = all_categories(category_id)
-        category_ids.append(category_id)
-        categories_to_delete = session.query(Category).filter(Category.category_id.in_(category_ids)).all()
-        if not categories_to_delete:
+        subtree_size = await session.scalar(COUNT_SUBTREE_QUERY, {"category_id": category_id})
+        if not subtree_size:
             raise HTTPException(status_code=404, detail="No categories found with the given parent ID")
-        for category in categories_to_delete:
-            session.delete(category)
-        session.commit() 
+        if subtree_size > DELETE_BACKGROUND_THRESHOLD:
+            job_id = str(uuid4())
+            await session.execute(INSERT_DELETE_JOB, {"job_id": job_id, "category_id": category_id, "category_count": subtree_size})
+            await session.commit()
+            task = asyncio.create_task(run_delete_job(job_id, category_id))
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+            return JSONResponse(status_code=202, content={"message": "Category deletion started", "job_id": job_id})
+        await delete_subtree(session, category_id)
         return JSONResponse(status_code=200, content={"message": "Category deleted successfully"})
+    except HTTPException:
+        raise
     except Exception as e:
-        session.rollback() 
+        await session.rollback() 
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        session.close()
\ No newline at end of file
+        await session.close()
+
+
+
+@router.get("/deleteCategory/{job_id}", tags=["deleteCategories"])
+async def delete_category_status(job_id: str):
+    """
+    Poll the status of a background category delete.
+    Args:
+    job_id: The job_id returned by DELETE /deleteCategory.
+    Returns:
+    dict: The job status (pending, running, completed or failed) and its details.
+    """
+    try:
+        PyUUID(job_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Delete job not found")
+    session = Session()
+    try:
+        job = (await session.execute(SELECT_DELETE_JOB, {"job_id": job_id})).mappings().first()
+    finally:
+        await session.close()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Delete job not found")
+    return JSONResponse(status_code=200, content={"job_id": job_id, **{key: value for key, value in job.items() if value is not None}})
+
+
+def create_app():
+    """
+    Build the FastAPI application. Resources are created by warm_up(), which
+    the startup handler runs in the background, so the app can be built (and
+    the module imported) without a database; run it with `uvicorn ontology_api:app` or
+    `uvicorn --factory ontology_api:create_app`.
+    """
+    application = FastAPI()
+    application.middleware("http")(require_ready)
+    application.middleware("http")(record_request_latency)
+    application.include_router(router)
+    application.add_event_handler("startup", startup)
+    application.add_event_handler("shutdown", shutdown)
+    return application
+
+
+app = create_app()
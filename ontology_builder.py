@@ -1,22 +1,37 @@
 import json
 from langchain_ollama import OllamaEmbeddings
 from langchain_postgres.vectorstores import PGVector
+from pgvector.sqlalchemy import Vector
 from env import DATABASE_URL
-from confluent_kafka import Consumer, Producer
-from langchain_core.documents import Document
-from sqlalchemy import create_engine, Column, Integer, String, VARCHAR, UUID, text
+from confluent_kafka import Consumer, KafkaException, TopicPartition
+from sqlalchemy import create_engine, Column, Integer, String, VARCHAR, UUID, select, text, update
+from sqlalchemy.dialects.postgresql import insert
 # from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, declarative_base
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 import os
+import queue
+import random
+import threading
+import time
 import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import itertools
 from pydantic import BaseModel
 from typing import List, Optional
+from category_index import CategoryIndex
+from category_hierarchy import CategoryHierarchy
+from response_producer import DeliveryError, ResponseProducer
+from pdf_processing import SPLITTER_PARAMS, iter_pdf_splits, stream_pdf_file
+from split_cache import SplitCache
+from embedding_cache import CachedEmbeddings
+from embedding_batcher import BatchingEmbeddings
+from migrations import EMBEDDING_DIM, MIGRATE_ON_STARTUP, run_migrations
+from prometheus_client import Counter, Gauge, Histogram, make_wsgi_app
+from ingest_workers import FlowController, KeyedExecutor, OffsetTracker, TenantScheduler
+from health_server import start_wsgi_server
 
 
-# Create a PostgreSQL engine
-engine = create_engine(DATABASE_URL)
 Base = declarative_base()
 
 
@@ -47,37 +62,170 @@ class Knowledge(Base):
     text = Column(VARCHAR)
     chunk_id = Column(UUID(as_uuid=True))
     file_id = Column(VARCHAR(255))
-
-
-Base.metadata.create_all(engine)
-Session = sessionmaker(bind=engine)
-
-
-local_embeddings = OllamaEmbeddings(model="bge-m3:latest")
-vector_store = PGVector(
-    embeddings=local_embeddings,
-    collection_name='categoryInfo',
-    connection=DATABASE_URL,
-    use_jsonb=True
+    # Kept so chunks can be re-classified without re-embedding their file
+    embedding = Column(Vector(EMBEDDING_DIM))
+
+
+# Created by init_builder(), so importing the module (or spawning a parser
+# process) does not touch PostgreSQL, Ollama or Kafka
+engine = None
+Session = None
+local_embeddings = None
+vector_store = None
+category_index = None
+consumer = None
+producer = None
+category_hierarchy = CategoryHierarchy()
+
+
+# Prometheus metrics, served on BUILDER_METRICS_PORT next to the /livez and
+# /readyz probes (0 disables the listener)
+BUILDER_METRICS_PORT = int(os.environ.get('BUILDER_METRICS_PORT', '9100'))
+STAGE_SECONDS = Histogram(
+    'ontology_builder_stage_seconds',
+    'Time spent in each ingestion stage',
+    ['stage'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
 )
-
-
+MESSAGES = Counter('ontology_builder_messages_total', 'Kafka messages processed', ['result'])
+CHUNKS = Counter('ontology_builder_chunks_total', 'Knowledge chunks stored')
+SPLIT_CACHE_REQUESTS = Counter('ontology_builder_split_cache_requests_total', 'Split cache lookups', ['result'])
+EMBEDDING_CACHE_TEXTS = Gauge('ontology_builder_embedding_cache_texts', 'Texts served by each embedding cache tier', ['result'])
+for _result in ('memory_hits', 'store_hits', 'misses'):
+    EMBEDDING_CACHE_TEXTS.labels(_result).set_function(lambda result=_result: local_embeddings.stats()[result] if local_embeddings else 0)
+STARTUP_SECONDS = Gauge('ontology_builder_startup_seconds', 'Time init_builder() took to create and warm up the resources')
+
+
+# Messages run on BUILDER_WORKERS threads and PDFs are parsed in a process
+# pool. 0 runs one message at a time and parses PDFs on the worker thread.
+BUILDER_WORKERS = int(os.environ.get('BUILDER_WORKERS', '0'))
+BUILDER_PARSE_PROCESSES = int(os.environ.get('BUILDER_PARSE_PROCESSES', str(os.cpu_count() or 1)))
+# Polled messages one tenant may have queued before the partitions they came
+# from are paused, and a hard bound over all tenants that pauses every partition
+BUILDER_MAX_QUEUED_PER_TENANT = int(os.environ.get('BUILDER_MAX_QUEUED_PER_TENANT', str(max(BUILDER_WORKERS, 1) * 8)))
+BUILDER_MAX_QUEUED = int(os.environ.get('BUILDER_MAX_QUEUED', str(BUILDER_MAX_QUEUED_PER_TENANT * 4)))
+# Average message processing time above which the queue bound shrinks
+BUILDER_LATENCY_TARGET = float(os.environ.get('BUILDER_LATENCY_TARGET', '60'))
+# Failed messages are retried with exponential backoff, then dead-lettered
+BUILDER_MAX_RETRIES = int(os.environ.get('BUILDER_MAX_RETRIES', '3'))
+BUILDER_RETRY_BACKOFF = float(os.environ.get('BUILDER_RETRY_BACKOFF', '1'))
+BUILDER_RETRY_BACKOFF_MAX = float(os.environ.get('BUILDER_RETRY_BACKOFF_MAX', '30'))
+DEAD_LETTER_TOPIC = os.environ.get('DEAD_LETTER_TOPIC', 'panini-ontology-request-dlq')
+# Dead-letter envelopes are cut to this size, below the broker's message.max.bytes
+DEAD_LETTER_MAX_BYTES = int(os.environ.get('DEAD_LETTER_MAX_BYTES', '900000'))
+# Malformed requests fail the same way on every attempt and are not retried
+PERMANENT_ERRORS = (ValueError, TypeError, KeyError, AttributeError)
+QUEUED_MESSAGES = Gauge('ontology_builder_queued_messages', 'Polled messages waiting for a worker')
+PAUSED = Gauge('ontology_builder_paused', 'Consumer partitions currently paused')
+flow_controller = FlowController(BUILDER_MAX_QUEUED_PER_TENANT, BUILDER_LATENCY_TARGET)
+
+
+# Chunks are committed (and checkpointed) in batches of this size
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', '256'))
+# Stored chunks re-scored per transaction when the ontology changes
+RECLASSIFY_BATCH_SIZE = int(os.environ.get('RECLASSIFY_BATCH_SIZE', '1000'))
+# Learning objectives embedded (and stored) per call during a bulk import
+BULK_EMBED_BATCH_SIZE = int(os.environ.get('BULK_EMBED_BATCH_SIZE', '256'))
+# uuid5 namespace of chunk IDs, which are derived from (file content, upload category, position)
+CHUNK_ID_NAMESPACE = uuid.UUID('7d5e7118-3c54-445c-a85c-8c3b2980746d')
+
+
+KAFKA_BOOTSTRAP_SERVERS = os.environ.get('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092')
 conf = {
-    'bootstrap.servers': 'localhost:9092',
+    'bootstrap.servers': KAFKA_BOOTSTRAP_SERVERS,
     'group.id': 'my-group',
     'auto.offset.reset': 'earliest',
+    # Offsets are committed only once a message's database work has landed
+    'enable.auto.commit': False,
 }
 
 
-consumer = Consumer(conf)
-consumer.subscribe(['panini-ontology-request'])
-
-
 # Kafka Producer Configuration
 producer_conf = {
-    'bootstrap.servers': 'localhost:9092'
+    'bootstrap.servers': KAFKA_BOOTSTRAP_SERVERS
 }
-producer = Producer(producer_conf)
+
+# Liveness: the consumer loop must poll at least this often
+BUILDER_LIVENESS_TIMEOUT = float(os.environ.get('BUILDER_LIVENESS_TIMEOUT', '60'))
+builder_ready = threading.Event()
+last_poll = time.monotonic()
+metrics_app = make_wsgi_app()
+
+
+def init_builder():
+    """
+    Create the builder's resources, once: the database engine and schema, the
+    embedding model, the vector store and the resident category index. Pool
+    connections for the worker threads are opened up front so the first
+    messages do not pay for them. The Kafka clients are created separately by
+    init_kafka(). Returns the seconds it took.
+    """
+    global engine, Session, local_embeddings, vector_store, category_index
+    if builder_ready.is_set():
+        return 0.0
+    # The spawned PDF parser processes re-import this module; they only need the
+    # parsing functions, never the engine, the vector store or a Kafka consumer
+    if multiprocessing.parent_process() is not None:
+        raise RuntimeError("init_builder() must not run in a PDF parser process")
+    start = time.perf_counter()
+    engine = create_engine(DATABASE_URL, pool_size=max(BUILDER_WORKERS, 1) + 2, pool_pre_ping=True)
+    Session = sessionmaker(bind=engine)
+    # Every chunk and category text goes through the cache, PGVector included;
+    # cache misses of concurrent workers are merged into micro-batches
+    local_embeddings = CachedEmbeddings(BatchingEmbeddings(OllamaEmbeddings(model="bge-m3:latest")), engine)
+    vector_store = PGVector(
+        embeddings=local_embeddings,
+        collection_name='categoryInfo',
+        connection=DATABASE_URL,
+        embedding_length=EMBEDDING_DIM,
+        use_jsonb=True
+    )
+    # Runs after PGVector so the vector extension and its tables exist for the
+    # knowledge embedding column and the vector index migration
+    Base.metadata.create_all(engine)
+    if MIGRATE_ON_STARTUP:
+        with engine.connect() as connection:
+            run_migrations(connection)
+    category_index = CategoryIndex(engine, 'categoryInfo')
+    category_index.load()
+    # Open a pooled connection per worker thread up front
+    connections = [engine.connect() for _ in range(max(BUILDER_WORKERS, 1))]
+    for connection in connections:
+        connection.close()
+    seconds = time.perf_counter() - start
+    STARTUP_SECONDS.set(seconds)
+    builder_ready.set()
+    print(f"Builder ready in {seconds:.2f}s")
+    return seconds
+
+
+def init_kafka():
+    """Create the response producer and the request consumer, unless already set (e.g. by the benchmarks)."""
+    global consumer, producer
+    if producer is None:
+        producer = ResponseProducer(producer_conf)
+    if consumer is None:
+        consumer = Consumer(conf)
+
+
+def health_app(environ, start_response):
+    # /livez and /readyz for probes, everything else is the Prometheus exposition
+    path = environ.get('PATH_INFO')
+    if path == '/livez':
+        alive = time.monotonic() - last_poll < BUILDER_LIVENESS_TIMEOUT or not builder_ready.is_set()
+        status, body = ('200 OK', b'alive\n') if alive else ('503 Service Unavailable', b'consumer loop stalled\n')
+    elif path == '/readyz':
+        status, body = ('200 OK', b'ready\n') if builder_ready.is_set() else ('503 Service Unavailable', b'starting\n')
+    else:
+        return metrics_app(environ, start_response)
+    start_response(status, [('Content-Type', 'text/plain')])
+    return [body]
+
+# 'per_chunk' sends one response per chunk, 'per_file' one summary per file,
+# split into pages of at most RESPONSE_PAGE_SIZE chunks so a large file stays
+# below the broker's message size limit
+RESPONSE_MODE = os.environ.get('RESPONSE_MODE', 'per_chunk')
+RESPONSE_PAGE_SIZE = int(os.environ.get('RESPONSE_PAGE_SIZE', '5000'))
 
 
 # Pydantic models for request and response
@@ -88,6 +236,8 @@ class KafkaRequest(BaseModel):
     learning_obj: Optional[str] = None
     tenant: str = None
     parent_id: Optional[str] = None
+    # Bulk import: a whole category tree (category_id, category_name, parent_id, learning_obj)
+    categories: Optional[List[dict]] = None
 
 
 class KafkaResponse(BaseModel):
@@ -97,190 +247,755 @@ class KafkaResponse(BaseModel):
     error_message: Optional[str] = None
 
 
+class ChunkAssignment(BaseModel):
+    category_id: str
+    chunk_id: str
+
+
+class KafkaFileResponse(BaseModel):
+    file_id: Optional[str] = None
+    chunks: List[ChunkAssignment] = []
+    page: int = 1
+    pages: int = 1
+    error_message: Optional[str] = None
+
+
+class KafkaBulkImportResponse(BaseModel):
+    created: int = 0
+    skipped_category_ids: List[str] = []
+    error_message: Optional[str] = None
+
+
+class KafkaReassignmentResponse(BaseModel):
+    category_id: Optional[str] = None
+    reassigned: List[ChunkAssignment] = []
+    error_message: Optional[str] = None
+
+
 def send_response(topic: str, response: dict):
     # Create a KafkaResponse object from the response_data dictionary
     response = KafkaResponse(**response)
-    # Send the response back to the Kafka topic
+    # Queue the response, it is delivered on the next flush
     producer.produce(topic, value=response.json())
-    producer.flush()
-    print("Sent response!")
+
+
+def send_file_responses(topic: str, file_id, rows: List[dict], page=1, pages=1):
+    if RESPONSE_MODE == 'per_file':
+        chunks = [ChunkAssignment(category_id=row['category_id'], chunk_id=str(row['chunk_id'])) for row in rows]
+        producer.produce(topic, value=KafkaFileResponse(file_id=file_id, chunks=chunks, page=page, pages=pages).json())
+    else:
+        for row in rows:
+            response = {
+                'category_id': row['category_id'],
+                'chunk_id': str(row['chunk_id']),
+                'file_id': file_id,
+                'error_message': None
+            }
+            send_response(topic, response)
+    print(f"Sent {len(rows)} responses!")
 
 
 LOCAL_DIRECTORY = 'knowledge_files'
+split_cache = SplitCache(
+    os.environ.get('SPLIT_CACHE_DIR', 'split_cache'),
+    int(os.environ.get('SPLIT_CACHE_MAX_BYTES', str(2 * 1024 ** 3))),
+    SPLITTER_PARAMS
+)
 
 
 def custom_deserializer(value):
     if value:
         try:
             return json.loads(value.decode('utf-8'))
-        except json.JSONDecodeError:
-            return value.decode('utf-8')  # Fallback to plain text
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return value.decode('utf-8', 'replace')  # Fallback to plain text
     return None
 
 
-def process_pdf_file(file_path):
-    loader = PyPDFLoader(file_path)
-    pages = loader.load()
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=2000,
-        chunk_overlap=0,
-        separators=["\n\n", "\n", ".", "\uff0e", "\u3002"]
+# Set by run_workers() so CPU-bound parsing leaves the worker threads; the
+# manager owns the queues the splits stream back through
+pdf_executor = None
+pdf_manager = None
+# Parsed batches a pool process may run ahead of the worker consuming them
+PARSE_QUEUE_BATCHES = 2
+
+
+def iter_splits(file_path, hash_value):
+    """Return a lazy iterator over the splits of a file."""
+    # Known content skips PDF parsing entirely
+    if hash_value:
+        cached_splits = split_cache.iter_splits(hash_value)
+        SPLIT_CACHE_REQUESTS.labels('miss' if cached_splits is None else 'hit').inc()
+        if cached_splits is not None:
+            return cached_splits
+    if pdf_executor is not None:
+        return stream_from_pool(file_path, hash_value)
+    return parse_splits(file_path, hash_value)
+
+
+def stream_from_pool(file_path, hash_value):
+    # The pool process parses (and caches) the file while its splits arrive
+    # here INGEST_BATCH_SIZE at a time, so the first chunks are stored before
+    # the last pages are parsed
+    batches = pdf_manager.Queue(PARSE_QUEUE_BATCHES)
+    stop = pdf_manager.Event()
+    future = pdf_executor.submit(stream_pdf_file, file_path, batches, stop, INGEST_BATCH_SIZE,
+                                 hash_value, split_cache.directory, split_cache.max_bytes)
+    finished = False
+    try:
+        while True:
+            try:
+                batch = batches.get(timeout=1.0)
+            except queue.Empty:
+                # The end marker is queued before the task returns, so a finished
+                # task without one means the pool process failed
+                if future.done():
+                    future.result()
+                continue
+            if batch is None:
+                break
+            yield from batch
+        observe_stage_timings(future.result())
+        finished = True
+    finally:
+        if not finished:
+            # Abandoned or failed: stop the parser and unblock it until it returns
+            stop.set()
+            while not future.done():
+                try:
+                    batches.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+
+def parse_splits(file_path, hash_value):
+    timings = {}
+    splits = iter_pdf_splits(file_path, timings)
+    if hash_value:
+        splits = split_cache.tee(hash_value, splits)
+    yield from splits
+    observe_stage_timings(timings)
+
+
+def observe_stage_timings(timings):
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+def add_category_vector(category_id, category_name, learning_obj, tenant):
+    # Embed once and reuse the vector for both the collection and the resident index
+    page_content = category_name + learning_obj
+    with STAGE_SECONDS.labels('embed').time():
+        embedding = local_embeddings.embed_documents([page_content])[0]
+    vector_store.add_embeddings(
+        [page_content],
+        [embedding],
+        metadatas=[{"id": category_id, "category_name": category_name, "tenant": tenant}],
+        ids=[category_id]
     )
-    all_splits = text_splitter.split_documents(pages)
-    return all_splits
+    category_index.add(category_id, embedding, tenant)
+
+
+def embed_splits(all_splits):
+    # Embed every split of the batch in one call
+    with STAGE_SECONDS.labels('embed').time():
+        return local_embeddings.embed_documents([split.page_content for split in all_splits])
+
+
+def classify_vectors(vectors, category_ids, tenant=None):
+    # Score the vectors against the tenant's subtree in one product
+    with STAGE_SECONDS.labels('similarity_search').time():
+        return category_index.classify(vectors, category_ids, tenant)
+
+
+def classify_splits(all_splits, category_ids, tenant=None):
+    return classify_vectors(embed_splits(all_splits), category_ids, tenant)
+
+
+def drop_deleted_categories(session, category_ids, fallback=None):
+    """
+    Replace the ids of categories deleted since the index and the hierarchy
+    cache last saw them (the API deletes subtrees) with `fallback`, or with
+    None when the fallback is gone as well, and evict them from both caches.
+    """
+    chosen = {category_id for category_id in category_ids if category_id is not None}
+    if not chosen:
+        return category_ids
+    if fallback is not None:
+        chosen.add(fallback)
+    existing = set(session.execute(
+        text("SELECT category_id FROM category WHERE category_id = ANY(:category_ids)"),
+        {'category_ids': list(chosen)}
+    ).scalars())
+    deleted = chosen - existing
+    if not deleted:
+        return category_ids
+    print(f"Skipping deleted categories {sorted(deleted)}")
+    category_index.remove(deleted)
+    category_hierarchy.invalidate()
+    fallback = fallback if fallback in existing else None
+    return [fallback if category_id in deleted else category_id for category_id in category_ids]
+
+
+def chunk_uuid(content_key, category_id, index):
+    return uuid.uuid5(CHUNK_ID_NAMESPACE, f"{content_key}:{category_id}:{index}")
+
+
+def build_chunk_rows(file_id, content_key, upload_category_id, batch_start, splits, category_ids, vectors):
+    # One knowledge row per split, skipping splits that could not be classified
+    rows = []
+    for index, (split, category_id, vector) in enumerate(zip(splits, category_ids, vectors), start=batch_start):
+        if category_id is None:
+            continue
+        chunk_id = chunk_uuid(content_key, upload_category_id, index)
+        rows.append({'category_id': category_id, 'text': split.page_content, 'chunk_id': chunk_id, 'file_id': file_id, 'embedding': vector})
+    return rows
+
+
+SAVE_CHECKPOINT_QUERY = text("""
+    INSERT INTO ingest_progress (file_id, category_id, next_chunk_index)
+    VALUES (:file_id, :category_id, :next_chunk_index)
+    ON CONFLICT (file_id, category_id)
+    DO UPDATE SET next_chunk_index = EXCLUDED.next_chunk_index, updated_at = now()
+""")
+
+
+def load_checkpoint(session, file_id, category_id):
+    next_chunk_index = session.execute(
+        text("SELECT next_chunk_index FROM ingest_progress WHERE file_id = :file_id AND category_id = :category_id"),
+        {'file_id': file_id, 'category_id': category_id}
+    ).scalar()
+    return next_chunk_index or 0
+
+
+def store_chunks(session, rows):
+    # One batched upsert per transaction
+    with STAGE_SECONDS.labels('db_commit').time():
+        if rows:
+            session.execute(insert(Knowledge).on_conflict_do_nothing(index_elements=['chunk_id']), rows)
+        session.commit()
+    CHUNKS.inc(len(rows))
+
+
+def save_checkpoint(session, file_id, category_id, next_index, done):
+    # The progress checkpoint, plus the file status on the last batch
+    with STAGE_SECONDS.labels('db_commit').time():
+        session.execute(SAVE_CHECKPOINT_QUERY, {'file_id': file_id, 'category_id': category_id, 'next_chunk_index': next_index})
+        if done:
+            update_status_query = text("UPDATE knowledge_file_info SET status = 1 WHERE file_id = :file_id")
+            session.execute(update_status_query, {'file_id': file_id})
+        session.commit()
+
+
+def ingest_file(session, file_id, category_id):
+    """
+    Store the chunks of a file under `category_id`, classified into its subtree
+    when it has one. Pages are parsed lazily and every INGEST_BATCH_SIZE chunks
+    are classified, committed with a checkpoint and answered before the next
+    pages are read. A retry resumes after the last checkpointed batch and
+    re-inserting an existing chunk is a no-op.
+    """
+    # Fetch the file name from the database
+    file_record = session.query(Files).filter(Files.file_id == file_id).first()
+    file_path = os.path.join(LOCAL_DIRECTORY, file_record.file_name)
+    content_key = file_record.hash_value or file_id
+    tenant = session.query(Category.tenant).filter_by(category_id=category_id).limit(1).scalar()
+    category_ids = category_hierarchy.descendants(session, category_id)
+    start = load_checkpoint(session, file_id, category_id)
+    if start:
+        print(f"Resuming file {file_id} at chunk {start}")
+
+    def store_batch(batch_start, batch, done):
+        # Chunks are embedded even without subcategories, so they can be re-classified once some are added
+        vectors = embed_splits(batch) if batch else []
+        if category_ids and batch:
+            best_category_ids = classify_vectors(vectors, category_ids + [category_id], tenant)
+        else:
+            best_category_ids = [category_id] * len(batch)
+        best_category_ids = drop_deleted_categories(session, best_category_ids, category_id)
+        rows = build_chunk_rows(file_id, content_key, category_id, batch_start, batch, best_category_ids, vectors)
+        store_chunks(session, rows)
+        if RESPONSE_MODE == 'per_chunk' and rows:
+            send_file_responses('panini-ontology-response', file_id, rows)
+            with STAGE_SECONDS.labels('kafka_flush').time():
+                producer.flush()
+        # Only move past the batch once its responses are out; a retry re-sends them
+        # and re-inserting the stored chunks is a no-op
+        save_checkpoint(session, file_id, category_id, batch_start + len(batch), done)
+
+    batch_start = start
+    batch = []
+    # Committed chunks are still read (cheaply, from the split cache) to keep positions stable
+    for split in itertools.islice(iter_splits(file_path, file_record.hash_value), start, None):
+        batch.append(split)
+        if len(batch) == INGEST_BATCH_SIZE:
+            store_batch(batch_start, batch, done=False)
+            batch_start += len(batch)
+            batch = []
+    store_batch(batch_start, batch, done=True)
+    total_chunks = batch_start + len(batch)
+    print("added to knowledge!")
+    if RESPONSE_MODE == 'per_file':
+        # The summary covers chunks committed by earlier attempts as well. Each
+        # page covers RESPONSE_PAGE_SIZE chunk positions and is read on its own.
+        pages = max(1, -(-total_chunks // RESPONSE_PAGE_SIZE))
+        for page in range(pages):
+            page_start = page * RESPONSE_PAGE_SIZE
+            chunk_ids = [chunk_uuid(content_key, category_id, index) for index in range(page_start, min(page_start + RESPONSE_PAGE_SIZE, total_chunks))]
+            rows = session.execute(
+                text("SELECT chunk_id, category_id FROM knowledge WHERE chunk_id = ANY(:chunk_ids)"),
+                {'chunk_ids': chunk_ids}
+            ).mappings().all()
+            send_file_responses('panini-ontology-response', file_id, rows, page + 1, pages)
+
+
+def reclassify_chunks(session, source_category_id, category_ids, tenant=None):
+    """
+    Re-score the chunks stored under `source_category_id` against
+    `category_ids` (which includes the source) using their stored embeddings,
+    embedding only chunks stored before embeddings were kept. Moved chunks are
+    updated in bulk and reported as one compact response per batch. Returns
+    the number of moved chunks.
+    """
+    moved = 0
+    last_id = 0
+    while True:
+        chunks = session.execute(
+            select(Knowledge.id, Knowledge.chunk_id, Knowledge.text, Knowledge.embedding)
+            .where(Knowledge.category_id == source_category_id, Knowledge.id > last_id)
+            .order_by(Knowledge.id)
+            .limit(RECLASSIFY_BATCH_SIZE)
+        ).all()
+        if not chunks:
+            break
+        last_id = chunks[-1].id
+        missing = [chunk for chunk in chunks if chunk.embedding is None]
+        embedded = {}
+        if missing:
+            with STAGE_SECONDS.labels('embed').time():
+                vectors = local_embeddings.embed_documents([chunk.text for chunk in missing])
+            embedded = {chunk.id: vector for chunk, vector in zip(missing, vectors)}
+            session.execute(update(Knowledge), [{'id': chunk_id, 'embedding': vector} for chunk_id, vector in embedded.items()])
+        vectors = [embedded[chunk.id] if chunk.embedding is None else chunk.embedding for chunk in chunks]
+        best_category_ids = drop_deleted_categories(session, classify_vectors(vectors, category_ids, tenant))
+        changes = [
+            (chunk, best) for chunk, best in zip(chunks, best_category_ids)
+            if best is not None and best != source_category_id
+        ]
+        with STAGE_SECONDS.labels('db_commit').time():
+            if changes:
+                session.execute(update(Knowledge), [{'id': chunk.id, 'category_id': best} for chunk, best in changes])
+            session.commit()
+        if changes:
+            reassigned = [ChunkAssignment(category_id=best, chunk_id=str(chunk.chunk_id)) for chunk, best in changes]
+            response = KafkaReassignmentResponse(category_id=source_category_id, reassigned=reassigned)
+            producer.produce('panini-ontology-response', value=response.json())
+            moved += len(changes)
+    if moved:
+        print(f"Re-classified {moved} chunks out of {source_category_id}")
+    return moved
+
+
+def reclassify_for_category(session, category_id, parent_id, tenant):
+    """
+    Re-route stored chunks after `category_id` was created or its vector changed.
+    Chunks of the parent only compete against the parent and this category (every
+    other candidate already lost to the parent), and chunks of the category itself
+    against its own subtree, so chunks never leave the subtree they were uploaded to.
+    """
+    with STAGE_SECONDS.labels('reclassify').time():
+        if parent_id:
+            reclassify_chunks(session, parent_id, [parent_id, category_id], tenant)
+        descendants = category_hierarchy.descendants(session, category_id)
+        if descendants:
+            reclassify_chunks(session, category_id, descendants + [category_id], tenant)
+
+
+def validate_category_tree(categories, existing_ids):
+    """
+    Check an imported tree in memory: every category needs an id and a name,
+    ids are unique, and every parent is either imported or already exists,
+    without cycles. Returns an error message, or None when the tree is valid.
+    """
+    parents = {}
+    for category in categories:
+        category_id = category.get('category_id')
+        if not category_id or not category.get('category_name'):
+            return "Every category needs a category_id and a category_name!"
+        if category_id in parents:
+            return f"Duplicate category_id {category_id}!"
+        parents[category_id] = category.get('parent_id')
+    for category_id, parent_id in parents.items():
+        if parent_id and parent_id not in parents and parent_id not in existing_ids:
+            return f"Parent category {parent_id} of {category_id} not found!"
+    # Walk up from every category; each category is settled once, so this stays linear
+    acyclic = set(existing_ids)
+    for category_id in parents:
+        path = []
+        current = category_id
+        while current in parents and current not in acyclic:
+            if current in path:
+                return f"Category {current} is its own ancestor!"
+            path.append(current)
+            current = parents[current]
+        acyclic.update(path)
+    return None
 
 
-def all_categories(category_id):
-    session = Session()
-    all_category = []
-    category_object = session.query(Category).filter_by(parent_id = category_id).all()
-    if category_object:
-        for category in category_object:
-            all_category.append(category.category_id)
-            all_category.extend(all_categories(category.category_id))
-    return all_category
+def import_categories(session, categories, tenant):
+    """
+    Create a whole category tree from one message: parent links are validated
+    in memory, the categories are inserted in one statement and their learning
+    objectives embedded and stored BULK_EMBED_BATCH_SIZE at a time. Categories
+    that already exist are skipped. Chunks of existing parents that received
+    new subcategories are re-classified, and one summary response is sent.
+    """
+    referenced_ids = {category.get('category_id') for category in categories} | {category.get('parent_id') for category in categories}
+    referenced_ids.discard(None)
+    existing_ids = set(session.scalars(select(Category.category_id).where(Category.category_id.in_(referenced_ids))))
+    new_categories = [category for category in categories if category.get('category_id') not in existing_ids]
+    error_message = validate_category_tree(new_categories, existing_ids)
+    if error_message:
+        producer.produce('panini-ontology-response', value=KafkaBulkImportResponse(error_message=error_message).json())
+        return
+    rows = [
+        {
+            'category_id': category['category_id'],
+            'category_name': category['category_name'],
+            'parent_id': category.get('parent_id'),
+            'tenant': category.get('tenant', tenant),
+        }
+        for category in new_categories
+    ]
+    if rows:
+        session.execute(insert(Category), rows)
+    for start in range(0, len(rows), BULK_EMBED_BATCH_SIZE):
+        batch = new_categories[start:start + BULK_EMBED_BATCH_SIZE]
+        batch_rows = rows[start:start + BULK_EMBED_BATCH_SIZE]
+        texts = [category['category_name'] + (category.get('learning_obj') or '') for category in batch]
+        with STAGE_SECONDS.labels('embed').time():
+            vectors = local_embeddings.embed_documents(texts)
+        vector_store.add_embeddings(
+            texts,
+            vectors,
+            metadatas=[{"id": row['category_id'], "category_name": row['category_name'], "tenant": row['tenant']} for row in batch_rows],
+            ids=[row['category_id'] for row in batch_rows]
+        )
+        category_index.add_many((row['category_id'], vector, row['tenant']) for row, vector in zip(batch_rows, vectors))
+    session.commit()
+    category_hierarchy.invalidate()
+    print(f"Imported {len(rows)} categories!")
+    with STAGE_SECONDS.labels('reclassify').time():
+        for parent_id in dict.fromkeys(row['parent_id'] for row in rows if row['parent_id'] in existing_ids):
+            descendants = category_hierarchy.descendants(session, parent_id)
+            reclassify_chunks(session, parent_id, [parent_id] + descendants, tenant)
+    skipped_category_ids = [category.get('category_id') for category in categories if category.get('category_id') in existing_ids]
+    response = KafkaBulkImportResponse(created=len(rows), skipped_category_ids=skipped_category_ids)
+    producer.produce('panini-ontology-response', value=response.json())
+
+
+def handle_message(session, message_value):
+    print(message_value)
+    required_keys = ['file_id', 'category_id', 'category_name', 'tenant', 'parent_id', 'learning_obj']
+    # Ensure all necessary fields are present and set missing variables to None
+    for key in required_keys:
+        if key not in message_value:
+            message_value[key] = None
+    file_id = message_value['file_id']
+    category_id = message_value['category_id']
+    category_name = message_value['category_name']
+    learning_obj = message_value['learning_obj']
+    tenant = message_value['tenant']
+    parent_id = message_value['parent_id']
+    print("Received Items!")
+    if category_id:
+        # Check if category_id exists in the database
+        existing_category = session.query(Category).filter_by(category_id=category_id).first()
+        if existing_category:
+            print(f"Category ID {category_id} already exists in the database.")
+            if file_id:
+                ingest_file(session, file_id, category_id)
+            elif learning_obj:
+                # A new learning objective replaces the category vector and re-routes affected chunks
+                existing_category.category_name = category_name or existing_category.category_name
+                add_category_vector(category_id, existing_category.category_name, learning_obj, existing_category.tenant)
+                reclassify_for_category(session, category_id, existing_category.parent_id, existing_category.tenant)
+                send_response('panini-ontology-response', {'category_id': None, 'chunk_id': None, 'File_id': None, 'error_message': "Category updated successfully!"})
+            else:
+                send_response('panini-ontology-response', {'category_id': None, 'chunk_id': None, 'File_id': None, 'error_message': "Category already exists, provide file id for categorization!"})
+        else:
+            if parent_id:
+                existing_parent_id = session.query(Category).filter_by(category_id=parent_id).first()
+                if existing_parent_id:
+                    new_category = Category(category_name=category_name, category_id=category_id, parent_id=parent_id, tenant=tenant)
+                    session.add(new_category)
+                    add_category_vector(category_id, category_name, learning_obj, tenant)
+                    print("docs added in collection!")
+                    # Drop cached subtrees only once the category is visible to other sessions
+                    session.commit()
+                    category_hierarchy.invalidate()
+                    print("added to category!")
+                    reclassify_for_category(session, category_id, parent_id, tenant)
+                    send_response('panini-ontology-response', {'category_id': None, 'chunk_id': None, 'File_id': None, 'error_message': "Category created successfully!"})
+                else:
+                    send_response('panini-ontology-response', {'category_id': None, 'chunk_id': None, 'File_id': None, 'error_message': "Parent category not found!"})
+            else:
+                new_category = Category(category_name=category_name, category_id=category_id, parent_id=None, tenant=tenant)
+                session.add(new_category)
+                add_category_vector(category_id, category_name, learning_obj, tenant)
+                print("docs added in collection!")
+                session.commit()
+                category_hierarchy.invalidate()
+                print("added to category!")
+                send_response('panini-ontology-response', {'category_id': None, 'chunk_id': None, 'File_id': None, 'error_message': "Category created successfully!"})
+            if file_id:
+                ingest_file(session, file_id, category_id)
+        session.commit()
+    elif message_value.get('categories'):
+        import_categories(session, message_value['categories'], tenant)
+    # Single flush per message, once the database transaction has landed
+    with STAGE_SECONDS.labels('kafka_flush').time():
+        producer.flush()
+    print("Saved!")
+
+
+def send_to_dead_letter(msg, error, attempts):
+    envelope = {
+        'error': str(error),
+        'attempts': attempts,
+        'topic': msg.topic(),
+        'partition': msg.partition(),
+        'offset': msg.offset(),
+        'request': msg.value().decode('utf-8', 'replace') if msg.value() else None,
+    }
+    payload = json.dumps(envelope)
+    # An oversized request (or error) would be refused by the broker on every try
+    for field in ('request', 'error'):
+        while len(payload) > DEAD_LETTER_MAX_BYTES and envelope[field]:
+            envelope[field] = envelope[field][:len(envelope[field]) // 2]
+            envelope['truncated'] = True
+            payload = json.dumps(envelope)
+    delay = BUILDER_RETRY_BACKOFF
+    # The offset is committed once this returns, so keep trying until Kafka has the message
+    while True:
+        try:
+            with producer.collect():
+                producer.produce(DEAD_LETTER_TOPIC, value=payload, key=msg.key())
+                producer.flush()
+            return
+        except (DeliveryError, KafkaException) as e:
+            print(f"Dead-letter delivery failed, retrying in {delay:.1f}s: {str(e)}")
+            time.sleep(delay)
+            delay = min(delay * 2, BUILDER_RETRY_BACKOFF_MAX)
+
+
+def process_message(msg, message_value):
+    # Every attempt gets its own session; transient failures are retried with
+    # exponential backoff and jitter, anything else ends on the dead-letter topic
+    start = time.monotonic()
+    attempt = 0
+    try:
+        while True:
+            attempt += 1
+            session = Session()
+            try:
+                # Each attempt only answers for the responses it produced itself
+                with producer.collect():
+                    handle_message(session, message_value)
+                MESSAGES.labels('ok').inc()
+                return
+            except Exception as e:
+                try:
+                    session.rollback()
+                except Exception as rollback_error:
+                    # e.g. the connection dropped; the session is discarded either way
+                    print(f"Rollback failed: {str(rollback_error)}")
+                if isinstance(e, PERMANENT_ERRORS) or attempt > BUILDER_MAX_RETRIES:
+                    MESSAGES.labels('dead_letter').inc()
+                    print(f"Error processing message, dead-lettering after {attempt} attempts: {str(e)}")
+                    send_to_dead_letter(msg, e, attempt)
+                    return
+                delay = min(BUILDER_RETRY_BACKOFF * 2 ** (attempt - 1), BUILDER_RETRY_BACKOFF_MAX) * random.uniform(0.5, 1)
+                MESSAGES.labels('retry').inc()
+                print(f"Error processing message, retrying in {delay:.1f}s: {str(e)}")
+                time.sleep(delay)
+            finally:
+                session.close()
+    finally:
+        flow_controller.observe(time.monotonic() - start)
 
 
-def main():
-    session = Session()
+def run_until_done(fn, *args):
+    # The message's offset is only committed once `fn` returns, so a failure
+    # it did not handle itself is logged and retried rather than skipped
+    delay = BUILDER_RETRY_BACKOFF
+    while True:
+        try:
+            return fn(*args)
+        except Exception as e:
+            print(f"{fn.__name__} failed, retrying in {delay:.1f}s: {str(e)}")
+            time.sleep(delay)
+            delay = min(delay * 2, BUILDER_RETRY_BACKOFF_MAX)
+
+
+def request_keys(message_value):
+    """
+    Ordering keys of a request: messages for the same category (or creating a
+    child of it) keep their order. None when the request is not a JSON object
+    of the expected shape.
+    """
+    if not isinstance(message_value, dict):
+        return None
+    categories = message_value.get('categories') or []
+    if not isinstance(categories, list) or not all(isinstance(category, dict) for category in categories):
+        return None
+    keys = [message_value.get('category_id'), message_value.get('parent_id')]
+    for category in categories:
+        keys += [category.get('category_id'), category.get('parent_id')]
+    # JSON lists and objects are not hashable, so keys are compared as text
+    return [str(key) for key in keys if key is not None]
+
+
+def commit_offsets(tracker):
+    offsets = tracker.committable()
+    if not offsets:
+        return
+    try:
+        consumer.commit(offsets=[TopicPartition(*offset) for offset in offsets], asynchronous=False)
+    except KafkaException as e:
+        # e.g. REBALANCE_IN_PROGRESS; the positions stay committable and are retried
+        print(f"Offset commit failed: {e}")
+        return
+    tracker.committed(offsets)
+
+
+def run_workers():
+    global pdf_executor, pdf_manager, last_poll
+    workers = max(BUILDER_WORKERS, 1)
+    tracker = OffsetTracker()
+    scheduler = TenantScheduler()
+    max_in_flight = workers * 2
+    if BUILDER_WORKERS > 0:
+        # spawn keeps the parser processes free of the consumer's threads and sockets
+        context = multiprocessing.get_context('spawn')
+        pdf_manager = context.Manager()
+        pdf_executor = ProcessPoolExecutor(BUILDER_PARSE_PROCESSES, mp_context=context)
+    threads = ThreadPoolExecutor(workers)
+    lanes = KeyedExecutor(threads)
+    in_flight = set()
+    paused = set()
+
+    def on_revoke(_, partitions):
+        # Runs inside consumer.poll(): commit what is done, then forget the revoked
+        # partitions so their redelivered offsets are tracked from scratch
+        commit_offsets(tracker)
+        revoked = {(partition.topic, partition.partition) for partition in partitions}
+        tracker.revoke(revoked)
+        paused.difference_update(revoked)
+        dropped = scheduler.remove(lambda item: (item[0].topic(), item[0].partition()) in revoked)
+        if dropped:
+            print(f"Dropped {len(dropped)} queued messages of revoked partitions")
+
+    def ready(held):
+        # A message is held back while an earlier one of its keys is running or
+        # still queued, so a parked chain never takes a worker slot
+        def check(item):
+            keys = item[3] or []
+            if lanes.busy(keys) or held.intersection(keys):
+                held.update(keys)
+                return False
+            return True
+        return check
+
+    def dispatch(item):
+        msg, message_value, generation, keys = item
+        if keys is not None:
+            future = lanes.submit(keys, run_until_done, process_message, msg, message_value)
+        else:
+            # Sent from a worker, the dead-letter topic may be slow to accept it
+            MESSAGES.labels('dead_letter').inc()
+            future = lanes.submit([], run_until_done, send_to_dead_letter, msg, "Request is not a well-formed JSON object", 0)
+        future.add_done_callback(lambda done: complete(done, msg, generation))
+        in_flight.add(future)
+
+    def complete(done, msg, generation):
+        # Only fails when the executor stopped before the task ran; the offset
+        # then stays uncommitted and the message is redelivered
+        if done.exception() is not None:
+            print(f"Message {msg.topic()}[{msg.partition()}]@{msg.offset()} not processed: {str(done.exception())}")
+            return
+        tracker.complete(msg.topic(), msg.partition(), msg.offset(), generation)
+
+    consumer.subscribe(['panini-ontology-request'], on_revoke=on_revoke, on_lost=on_revoke)
     try:
         while True:
-            msg = consumer.poll(1.0)
+            commit_offsets(tracker)
+            in_flight = {future for future in in_flight if not future.done()}
+            # Fill free worker slots round-robin across tenants
+            held = set()
+            while scheduler and len(in_flight) < max_in_flight:
+                item = scheduler.get(ready(held))
+                if item is None:
+                    break
+                dispatch(item)
+            QUEUED_MESSAGES.set(len(scheduler))
+            # Stop fetching from the partitions of a tenant over its latency-scaled
+            # bound, but keep polling so the consumer stays in the group. Other
+            # tenants keep flowing until the total bound is reached.
+            assignment = consumer.assignment()
+            if len(scheduler) >= BUILDER_MAX_QUEUED:
+                pause = {(partition.topic, partition.partition) for partition in assignment}
+            else:
+                queued = [(tenant, (item[0].topic(), item[0].partition())) for tenant, item in scheduler.items()]
+                pause = flow_controller.paused_partitions(queued, paused)
+            # Pausing is re-applied every round to cover partitions assigned by a rebalance
+            to_pause = [partition for partition in assignment if (partition.topic, partition.partition) in pause]
+            to_resume = [partition for partition in assignment if (partition.topic, partition.partition) in paused - pause]
+            if to_pause:
+                consumer.pause(to_pause)
+            if to_resume:
+                consumer.resume(to_resume)
+            paused.clear()
+            paused.update(pause)
+            PAUSED.set(len(paused))
+            last_poll = time.monotonic()
+            # Held messages are only dispatched between polls, so come back soon
+            msg = consumer.poll(0.1 if scheduler else 1.0)
             if msg is None:
                 continue
             if msg.error():
                 print(f"Consumer error: {msg.error()}")
                 continue
-            try:
-                message_value = custom_deserializer(msg.value())
-                if message_value is None:
-                    print("Received empty message")
-                    continue
-                print(message_value)
-                required_keys = ['file_id', 'category_id', 'category_name', 'tenant', 'parent_id', 'learning_obj']
-                # Ensure all necessary fields are present and set missing variables to None
-                for key in required_keys:
-                    if key not in message_value:
-                        message_value[key] = None
-                file_id = message_value['file_id']
-                category_id = message_value['category_id']
-                category_name = message_value['category_name']
-                learning_obj = message_value['learning_obj']
-                tenant = message_value['tenant']
-                parent_id = message_value['parent_id']
-                print("Received Items!")
-                if category_id:
-                    # Check if category_id exists in the database
-                    existing_category = session.query(Category).filter_by(category_id=category_id).first()
-                    if existing_category:
-                        print(f"Category ID {category_id} already exists in the database.")
-                        if file_id:
-                            # Fetch the file name from the database
-                            file_record = session.query(Files).filter(Files.file_id == file_id).first()
-                            file_name = file_record.file_name
-                            file_path = os.path.join(LOCAL_DIRECTORY, file_name)
-                            all_splits = process_pdf_file(file_path)
-                            category_ids = all_categories(category_id)
-                            if not category_ids:
-                                for split in all_splits:
-                                    chunk_id = uuid.uuid4()
-                                    new_category = Knowledge(category_id=category_id, text=split.page_content, chunk_id=chunk_id, file_id=file_id)
-                                    session.add(new_category)
-                                    response = {
-                                        'category_id': category_id,
-                                        'chunk_id': str(chunk_id),
-                                        'file_id': file_id,
-                                        'error_message': None
-                                    }
-                                    send_response('panini-ontology-response', response)
-                                print("added to knowledge!")
-                                session.commit()
-                                update_status_query = text("UPDATE knowledge_file_info SET status = 1 WHERE file_id = :file_id")
-                                session.execute(update_status_query, {'file_id': file_id})
-                                session.commit()
-                            else:
-                                category_ids = category_ids + [category_id]
-                                for split in all_splits:
-                                    docs = vector_store.similarity_search(split.page_content, k=1, filter={"id": {"$in": category_ids}})
-                                    for doc in docs:
-                                        doc_metadata = doc.metadata["id"]
-                                        chunk_id = uuid.uuid4()
-                                        new_category = Knowledge(category_id=doc_metadata, text=split.page_content, chunk_id=chunk_id, file_id=file_id)
-                                        session.add(new_category)
-                                        response = {
-                                            'category_id': doc_metadata,
-                                            'chunk_id': str(chunk_id),
-                                            'file_id': file_id,
-                                            'error_message': None
-                                        }
-                                        send_response('panini-ontology-response', response)
-                                print("added to knowledge!")
-                                session.commit()
-                                update_status_query = text("UPDATE knowledge_file_info SET status = 1 WHERE file_id = :file_id")
-                                session.execute(update_status_query, {'file_id': file_id})
-                                session.commit()
-                        else:
-                            send_response('panini-ontology-response', {'category_id': None, 'chunk_id': None, 'File_id': None, 'error_message': "Category already exists, provide file id for categorization!"})
-                    else:
-                        if parent_id:
-                            existing_parent_id = session.query(Category).filter_by(category_id=parent_id).first()
-                            if existing_parent_id:
-                                new_category = Category(category_name=category_name, category_id=category_id, parent_id=parent_id, tenant=tenant)
-                                session.add(new_category)
-                                print("added to category!")
-                                docs = [
-                                    Document(
-                                        page_content= category_name + learning_obj,
-                                        metadata={"id": category_id, "category_name": category_name}
-                                    )
-                                ]
-                                vector_store.add_documents(docs, ids=[doc.metadata["id"] for doc in docs])
-                                print("docs added in collection!")
-                                send_response('panini-ontology-response', {'category_id': None, 'chunk_id': None, 'File_id': None, 'error_message': "Category created successfully!"})
-                            else:
-                                send_response('panini-ontology-response', {'category_id': None, 'chunk_id': None, 'File_id': None, 'error_message': "Parent category not found!"})
-                        else:
-                            new_category = Category(category_name=category_name, category_id=category_id, parent_id=None, tenant=tenant)
-                            session.add(new_category)
-                            print("added to category!")
-                            docs = [
-                                Document(
-                                    page_content= category_name + learning_obj,
-                                    metadata={"id": category_id, "category_name": category_name}
-                                )
-                            ]
-                            vector_store.add_documents(docs, ids=[doc.metadata["id"] for doc in docs])
-                            print("docs added in collection!")
-                            send_response('panini-ontology-response', {'category_id': None, 'chunk_id': None, 'File_id': None, 'error_message': "Category created successfully!"})
-                        if file_id:
-                            # Fetch the file name from the database
-                            file_record = session.query(Files).filter(Files.file_id == file_id).first()
-                            file_name = file_record.file_name
-                            file_path = os.path.join(LOCAL_DIRECTORY, file_name)
-                            all_splits = process_pdf_file(file_path)
-                            for split in all_splits:
-                                chunk_id = uuid.uuid4() 
-                                new_category = Knowledge(category_id=category_id, text=split.page_content, chunk_id=chunk_id, file_id=file_id)
-                                session.add(new_category)
-                                response = {
-                                    'category_id': doc_metadata,
-                                    'chunk_id': str(chunk_id),
-                                    'file_id': file_id,
-                                    'error_message': None
-                                }
-                                # list_of_response.append(response)
-                                send_response('panini-ontology-response', response)
-                            print("added to knowledge!")
-                            update_status_query = text("UPDATE knowledge_file_info SET status = 1 WHERE file_id = :file_id")
-                            session.execute(update_status_query, {'file_id': file_id})
-                    session.commit()
-                print("Saved!")
-            except Exception as e:
-                print(f"Error processing message: {str(e)}")
+            generation = tracker.track(msg.topic(), msg.partition(), msg.offset())
+            message_value = custom_deserializer(msg.value())
+            if message_value is None:
+                print("Received empty message")
+                tracker.complete(msg.topic(), msg.partition(), msg.offset(), generation)
                 continue
+            tenant = message_value.get('tenant') if isinstance(message_value, dict) else None
+            scheduler.put(None if tenant is None else str(tenant), (msg, message_value, generation, request_keys(message_value)))
     except KeyboardInterrupt:
-        print("Shutting down consumer...")
+        print("Shutting down workers...")
+        # Finish what was already polled rather than leaving it for redelivery
+        while scheduler:
+            dispatch(scheduler.get())
     finally:
+        lanes.shutdown()
+        if pdf_executor is not None:
+            pdf_executor.shutdown(wait=True)
+            pdf_manager.shutdown()
+        commit_offsets(tracker)
         consumer.close()
+
+
+def main():
+    # Probes answer (not ready yet) while the resources are being created
+    if BUILDER_METRICS_PORT:
+        start_wsgi_server(BUILDER_METRICS_PORT, health_app)
+    init_builder()
+    init_kafka()
+    run_workers()
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,66 @@
+import itertools
+import time
+
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from split_cache import SplitCache
+
+
+# Part of the split cache key, changing them invalidates cached splits
+SPLITTER_PARAMS = {
+    'chunk_size': 2000,
+    'chunk_overlap': 0,
+    'separators': ["\n\n", "\n", ".", "\uff0e", "\u3002"],
+}
+
+
+# Kept free of database/Kafka side effects so it can be imported by
+# process-pool workers.
+def iter_pdf_splits(file_path, timings=None):
+    """
+    Yield the splits of a PDF page by page, so memory stays flat and the first
+    chunks are available before the last pages are parsed. Splitting is per
+    page, which matches split_documents() over the fully loaded document.
+    """
+    timings = {} if timings is None else timings
+    timings.setdefault('parse', 0.0)
+    timings.setdefault('split', 0.0)
+    text_splitter = RecursiveCharacterTextSplitter(**SPLITTER_PARAMS)
+    pages = PyPDFLoader(file_path).lazy_load()
+    while True:
+        start = time.perf_counter()
+        page = next(pages, None)
+        parsed = time.perf_counter()
+        timings['parse'] += parsed - start
+        if page is None:
+            return
+        splits = text_splitter.split_documents([page])
+        timings['split'] += time.perf_counter() - parsed
+        yield from splits
+
+
+def process_pdf_file(file_path, timings=None):
+    return list(iter_pdf_splits(file_path, timings))
+
+
+def stream_pdf_file(file_path, batches, stop, batch_size, hash_value=None, cache_directory=None, cache_max_bytes=None):
+    """
+    Process-pool entry point: send the splits back through the `batches`
+    queue `batch_size` at a time, followed by None, and return the stage
+    timings. With a hash the splits are also written to the split cache.
+    Stops early, without publishing a cache entry, once `stop` is set.
+    """
+    timings = {}
+    splits = iter_pdf_splits(file_path, timings)
+    if hash_value:
+        splits = SplitCache(cache_directory, cache_max_bytes, SPLITTER_PARAMS).tee(hash_value, splits)
+    try:
+        for batch in iter(lambda: list(itertools.islice(splits, batch_size)), []):
+            if stop.is_set():
+                splits.close()
+                break
+            batches.put(batch)
+    finally:
+        batches.put(None)
+    return timings
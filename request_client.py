@@ -0,0 +1,21 @@
+import json
+
+from response_producer import ResponseProducer
+
+
+class OntologyRequestClient:
+    """
+    Publishes builder requests to `panini-ontology-request` keyed by tenant.
+    All messages of a tenant land on the same partition and stay ordered,
+    while different tenants spread across partitions (and builder instances).
+    """
+
+    def __init__(self, conf, topic='panini-ontology-request'):
+        self.topic = topic
+        self.producer = ResponseProducer(conf)
+
+    def send(self, request: dict):
+        self.producer.produce(self.topic, json.dumps(request), key=request.get('tenant'))
+
+    def flush(self, timeout=30.0):
+        self.producer.flush(timeout)
@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from confluent_kafka import Producer
+
+
+# Batching/compression defaults for response traffic, overridable per deployment
+PRODUCER_TUNING = {
+    'linger.ms': int(os.environ.get('KAFKA_LINGER_MS', '20')),
+    'batch.size': int(os.environ.get('KAFKA_BATCH_SIZE', '262144')),
+    'compression.type': os.environ.get('KAFKA_COMPRESSION', 'lz4'),
+}
+
+
+class DeliveryError(Exception):
+    pass
+
+
+class DeliveryReport:
+    """Delivery outcome of the messages produced in one `ResponseProducer.collect()` block."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.errors = []
+
+    def sent(self):
+        with self._lock:
+            self.pending += 1
+
+    def on_delivery(self, err, msg):
+        if err is not None:
+            print(f"Delivery failed for {msg.topic()}: {err}")
+        with self._lock:
+            self.pending -= 1
+            if err is not None:
+                self.errors.append(err)
+
+    def take_errors(self):
+        with self._lock:
+            errors, self.errors = self.errors, []
+        return errors
+
+
+class ResponseProducer:
+    """
+    Non-blocking wrapper around the Kafka Producer.
+
+    `produce()` only enqueues; delivery reports are collected by a callback
+    and `flush()` (called once per transaction) raises DeliveryError if any
+    message was not delivered. Inside `collect()` a thread only sees the
+    reports of its own messages, not the failures of other workers.
+    """
+
+    def __init__(self, conf):
+        self.producer = Producer({**PRODUCER_TUNING, **conf})
+        self._local = threading.local()
+        # Messages produced outside of collect()
+        self._shared = DeliveryReport()
+
+    @contextmanager
+    def collect(self):
+        previous = getattr(self._local, 'report', None)
+        self._local.report = DeliveryReport()
+        try:
+            yield self._local.report
+        finally:
+            self._local.report = previous
+
+    def _report(self):
+        report = getattr(self._local, 'report', None)
+        return report if report is not None else self._shared
+
+    def produce(self, topic, value, key=None):
+        report = self._report()
+        while True:
+            try:
+                self.producer.produce(topic, value=value, key=key, on_delivery=report.on_delivery)
+                break
+            except BufferError:
+                # Local queue is full, serve delivery reports until there is room
+                self.producer.poll(0.5)
+        report.sent()
+        self.producer.poll(0)
+
+    def flush(self, timeout=30.0):
+        report = self._report()
+        deadline = time.monotonic() + timeout
+        # Other threads may serve this report's callbacks, so wait on its own count
+        while report.pending > 0 and time.monotonic() < deadline:
+            self.producer.flush(min(deadline - time.monotonic(), 0.5))
+        errors = report.take_errors()
+        if report.pending > 0:
+            raise DeliveryError(f"{report.pending} responses still undelivered after {timeout}s")
+        if errors:
+            raise DeliveryError(f"{len(errors)} responses failed delivery, first error: {errors[0]}")
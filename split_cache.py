@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import msgpack
+from langchain_core.documents import Document
+
+
+class SplitCache:
+    """
+    Content-addressed on-disk cache of PDF split results.
+
+    Entries are keyed by the file's SHA-256 and the splitter parameters and
+    stored as a stream of msgpack [page_content, metadata] records. The total
+    size is bounded by evicting the least recently used entries (by mtime,
+    which is bumped on every hit).
+    """
+
+    def __init__(self, directory, max_bytes, splitter_params):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.params_key = json.dumps(splitter_params, sort_keys=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, hash_value):
+        key = hashlib.sha256(f"{hash_value}:{self.params_key}".encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{key}.msgpack")
+
+    def iter_splits(self, hash_value):
+        """Return a lazy iterator over the cached splits of a file, or None on a miss."""
+        path = self._path(hash_value)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        os.utime(path)
+        with self._lock:
+            self.hits += 1
+        return self._read(f)
+
+    @staticmethod
+    def _read(f):
+        with f:
+            for page_content, metadata in msgpack.Unpacker(f, raw=False):
+                yield Document(page_content=page_content, metadata=metadata)
+
+    def get(self, hash_value):
+        """Return the cached splits of a file, or None on a miss."""
+        splits = self.iter_splits(hash_value)
+        return None if splits is None else list(splits)
+
+    def tee(self, hash_value, splits):
+        """
+        Yield `splits` while appending them to a new cache entry. The entry is
+        only published once the iterator is exhausted, an abandoned or failed
+        iteration leaves nothing behind.
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        published = False
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                packer = msgpack.Packer()
+                for split in splits:
+                    f.write(packer.pack([split.page_content, split.metadata]))
+                    yield split
+            os.replace(temp_path, self._path(hash_value))
+            published = True
+        finally:
+            if not published and os.path.exists(temp_path):
+                os.remove(temp_path)
+        self._evict()
+
+    def put(self, hash_value, splits):
+        for _ in self.tee(hash_value, splits):
+            pass
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.msgpack'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,163 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ingest_workers import FlowController, KeyedExecutor, OffsetTracker, TenantScheduler
+
+
+def test_offset_tracker_commits_only_the_completed_prefix():
+    tracker = OffsetTracker()
+    for offset in (10, 11, 12):
+        tracker.track('requests', 0, offset)
+    tracker.complete('requests', 0, 11)
+    assert tracker.committable() == []
+    tracker.complete('requests', 0, 10)
+    assert tracker.committable() == [('requests', 0, 12)]
+    assert len(tracker) == 1
+
+
+def test_offset_tracker_keeps_positions_until_committed():
+    tracker = OffsetTracker()
+    tracker.track('requests', 0, 5)
+    tracker.complete('requests', 0, 5)
+    offsets = tracker.committable()
+    assert offsets == [('requests', 0, 6)]
+    assert tracker.committable() == offsets
+    tracker.committed(offsets)
+    assert tracker.committable() == []
+
+
+def test_offset_tracker_needs_every_copy_of_a_redelivered_offset():
+    tracker = OffsetTracker()
+    tracker.track('requests', 0, 7)
+    tracker.track('requests', 0, 7)
+    tracker.complete('requests', 0, 7)
+    assert tracker.committable() == [('requests', 0, 8)]
+    assert len(tracker) == 1
+    tracker.complete('requests', 0, 7)
+    tracker.committable()
+    assert len(tracker) == 0
+
+
+def test_offset_tracker_ignores_completions_from_before_a_revoke():
+    tracker = OffsetTracker()
+    old = tracker.track('requests', 1, 3)
+    tracker.revoke({('requests', 1)})
+    new = tracker.track('requests', 1, 3)
+    assert new != old
+    tracker.complete('requests', 1, 3, old)
+    assert tracker.committable() == []
+    tracker.complete('requests', 1, 3, new)
+    assert tracker.committable() == [('requests', 1, 4)]
+
+
+def test_keyed_executor_runs_tasks_of_a_key_in_order():
+    lanes = KeyedExecutor(ThreadPoolExecutor(4))
+    order = []
+    release = threading.Event()
+
+    def task(name, wait=False):
+        if wait:
+            release.wait(5)
+        order.append(name)
+        return name
+
+    first = lanes.submit(['a'], task, 'first', True)
+    second = lanes.submit(['a', 'b'], task, 'second')
+    assert lanes.busy(['b'])
+    assert not second.done()
+    release.set()
+    assert second.result(5) == 'second'
+    assert first.result() == 'first'
+    assert order == ['first', 'second']
+    lanes.shutdown()
+    assert not lanes.busy(['a', 'b'])
+
+
+def test_keyed_executor_runs_disjoint_keys_concurrently():
+    lanes = KeyedExecutor(ThreadPoolExecutor(2))
+    release = threading.Event()
+    blocked = lanes.submit(['a'], release.wait, 5)
+    other = lanes.submit(['b'], lambda: 'done')
+    assert other.result(5) == 'done'
+    assert not blocked.done()
+    release.set()
+    lanes.shutdown()
+    assert blocked.result() is True
+
+
+def test_keyed_executor_runs_successors_of_a_failed_task():
+    lanes = KeyedExecutor(ThreadPoolExecutor(1))
+
+    def fail():
+        time.sleep(0.05)
+        raise ValueError('broken')
+
+    failed = lanes.submit(['a'], fail)
+    after = lanes.submit(['a'], lambda: 'after')
+    assert after.result(5) == 'after'
+    with pytest.raises(ValueError):
+        failed.result()
+    lanes.shutdown()
+
+
+def test_tenant_scheduler_serves_tenants_round_robin():
+    scheduler = TenantScheduler()
+    for item in ('a1', 'a2', 'a3'):
+        scheduler.put('a', item)
+    scheduler.put('b', 'b1')
+    assert len(scheduler) == 4
+    assert [scheduler.get() for _ in range(4)] == ['a1', 'b1', 'a2', 'a3']
+    assert not scheduler
+
+
+def test_tenant_scheduler_leaves_items_that_are_not_ready_queued():
+    scheduler = TenantScheduler()
+    scheduler.put('a', 'a1')
+    scheduler.put('a', 'a2')
+    scheduler.put('b', 'b1')
+    assert scheduler.get(lambda item: item != 'a1') == 'a2'
+    assert scheduler.get(lambda item: False) is None
+    assert len(scheduler) == 2
+    assert [scheduler.get(), scheduler.get()] == ['b1', 'a1']
+
+
+def test_tenant_scheduler_removes_matching_items():
+    scheduler = TenantScheduler()
+    scheduler.put('a', 1)
+    scheduler.put('a', 2)
+    scheduler.put('b', 3)
+    assert scheduler.items() == [('a', 1), ('a', 2), ('b', 3)]
+    assert scheduler.remove(lambda item: item % 2) == [1, 3]
+    assert len(scheduler) == 1
+    assert scheduler.get() == 2
+
+
+def test_flow_controller_shrinks_the_bound_when_processing_slows_down():
+    controller = FlowController(max_queued=100, target_seconds=1.0, alpha=0.5)
+    assert controller.limit() == 100
+    controller.observe(0.5)
+    assert controller.limit() == 100
+    controller.observe(3.5)
+    assert controller.limit() == 50
+    assert controller.should_pause(50)
+    assert not controller.should_pause(49)
+    assert controller.should_resume(25)
+    assert not controller.should_resume(26)
+
+
+def test_flow_controller_never_drops_below_one():
+    controller = FlowController(max_queued=4, target_seconds=0.01)
+    controller.observe(100.0)
+    assert controller.limit() == 1
+
+
+def test_flow_controller_pauses_only_the_partitions_of_a_full_tenant():
+    controller = FlowController(max_queued=4, target_seconds=1.0)
+    queued = [('a', 0)] * 3 + [('a', 1)] + [('b', 2)] * 2
+    assert controller.paused_partitions(queued, set()) == {0, 1}
+    # Partition 1 stays paused until tenant a drained to half the bound
+    assert controller.paused_partitions([('a', 1)] * 3, {0, 1}) == {1}
+    assert controller.paused_partitions([('a', 1)] * 2, {1}) == set()